@@ -0,0 +1,379 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import vehicles
+from cache import ResponseCache
+from export import export_all
+from multilingual import LOCALIZED_TABLES, MultilingualScraper
+from fetcher import FetchCoordinator, INPUT_CHOICE
+from poller import VacancyPoller
+from spatial import CarparkLocator, haversine
+from store import VacancyStore
+from stub_api import StubServer, generate_payload
+from tariff import TariffEvaluator
+from tests.helpers import make_scraper, normalized_table, per_id_table
+from vehicles import TABLES
+
+
+SUITE_SIZES = (100, 1000, 10000, 50000)
+
+
+def bench_get_table(n: int=10000) -> None:
+    """Time the normalizer against building the tables per car park"""
+    scraper = make_scraper(n)
+    for info in TABLES:
+        start = time.perf_counter()
+        per_id_table(scraper, info)
+        per_id_time = time.perf_counter() - start
+        start = time.perf_counter()
+        normalized_table(scraper, info)
+        normalized_time = time.perf_counter() - start
+        start = time.perf_counter()
+        scraper.get_table(info=info)
+        table_time = time.perf_counter() - start
+        print(f"{info}: per id {per_id_time:.3f}s, normalizer {normalized_time:.3f}s, get_table {table_time:.3f}s")
+
+
+def bench_fetch_all(n: int=1000, latency: float=0.2) -> None:
+    """Time fetching info and vacancy of every vehicle type one scraper after another against fetch_all"""
+    vehicle_types = INPUT_CHOICE["vehicleTypes"]
+    with StubServer(n, vehicle_types=vehicle_types, latency=latency) as server:
+        start = time.perf_counter()
+        for vehicle_type in vehicle_types:
+            scraper = vehicles.CarparkScraper(vehicle_type=vehicle_type, fetcher=FetchCoordinator(base_url=server.url))
+            scraper.get_data(data="info")
+            scraper.get_data(data="vacancy")
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fetcher = FetchCoordinator(base_url=server.url)
+        results = fetcher.fetch_all(vehicle_types=vehicle_types)
+        for vehicle_type in vehicle_types:
+            scraper = vehicles.CarparkScraper(vehicle_type=vehicle_type, info=results[("info", vehicle_type, "zh_TW")],
+                                              fetcher=fetcher)
+            scraper.load_data(data="vacancy", results=results[("vacancy", vehicle_type, "zh_TW")])
+        concurrent_time = time.perf_counter() - start
+    print(f"fetch {len(results)} queries: sequential {sequential_time:.3f}s, fetch_all {concurrent_time:.3f}s")
+
+
+def folder_size(path: str) -> int:
+    """Total size of the files under the path"""
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def bench_export(n: int=10000) -> None:
+    """Compare the file size and load time of the csv and parquet of every table"""
+    scraper = make_scraper(n)
+    with tempfile.TemporaryDirectory() as destination:
+        for info in TABLES:
+            csv_folder = os.path.join(destination, "csv")
+            parquet_folder = os.path.join(destination, "parquet")
+            scraper.save_csv(destination=csv_folder, info=info)
+            scraper.save_parquet(destination=parquet_folder, info=info)
+            csv_name = os.path.join(csv_folder, f"{info}.csv")
+            parquet_path = os.path.join(parquet_folder, info)
+
+            start = time.perf_counter()
+            pd.read_csv(csv_name, encoding="utf-8-sig")
+            csv_time = time.perf_counter() - start
+            start = time.perf_counter()
+            pd.read_parquet(parquet_path)
+            parquet_time = time.perf_counter() - start
+            print(f"{info}: csv {os.path.getsize(csv_name) / 1024:.0f}KB {csv_time:.3f}s, "
+                  f"parquet {folder_size(parquet_path) / 1024:.0f}KB {parquet_time:.3f}s")
+
+
+def bench_cache(n: int=10000, latency: float=0.2) -> None:
+    """Time a cold fetch of info against a cache hit and a revalidation answered by 304"""
+    with StubServer(n, latency=latency) as server, tempfile.TemporaryDirectory() as directory:
+        for label, ttl in (("cold", 3600), ("hit", 3600), ("revalidated", 0)):
+            fetcher = FetchCoordinator(base_url=server.url, cache=ResponseCache(directory, ttl=ttl))
+            requests = server.requests
+            start = time.perf_counter()
+            response = fetcher.get({"data": "info", "vehicleTypes": "privateCar", "lang": "zh_TW"})
+            elapsed = time.perf_counter() - start
+            print(f"info {label}: {elapsed:.3f}s, {server.requests - requests} requests, "
+                  f"{len(response.body) / 1024:.0f}KB, X-Cache {response.headers.get('X-Cache')}")
+
+
+def bench_stream(n: int=20000) -> None:
+    """Compare the peak memory of exporting all tables with streaming against loading the whole payload"""
+    with StubServer(n) as server, tempfile.TemporaryDirectory() as destination:
+        scraper = vehicles.CarparkScraper(vehicle_type="privateCar", fetcher=FetchCoordinator(base_url=server.url))
+        tracemalloc.start()
+        scraper.save_csv_stream(destination=os.path.join(destination, "stream"))
+        stream_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        scraper.get_data(data="info")
+        scraper.get_data(data="vacancy")
+        for info in TABLES:
+            scraper.save_csv(destination=os.path.join(destination, "full"), info=info)
+        full_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print(f"export {n} car parks: streaming peak {stream_peak / 1024 ** 2:.0f}MB, "
+          f"whole payload peak {full_peak / 1024 ** 2:.0f}MB")
+
+
+def bench_spatial(n: int=5000, queries: int=1000) -> None:
+    """Time the nearest and radius queries of the spatial index and check them against a full scan"""
+    scraper = make_scraper(n)
+    start = time.perf_counter()
+    locator = CarparkLocator.from_scraper(scraper)
+    build = time.perf_counter() - start
+    locator.update_vacancy(scraper.get_table("vacancy"))
+    rng = np.random.default_rng(0)
+    points = np.column_stack([22.2 + rng.random(queries) * 0.3, 113.9 + rng.random(queries) * 0.4])
+    available = locator.vacancy >= 1
+    for latitude, longitude in points[:100]:
+        distances = np.sort(haversine(latitude, longitude, locator.latitude[available], locator.longitude[available]))
+        nearest = [carpark["distance_km"] for carpark in locator.nearest(latitude, longitude, k=5, min_vacancy=1)]
+        assert np.allclose(nearest, distances[:5]), "nearest does not match the full scan"
+        assert len(locator.within(latitude, longitude, 1.0, min_vacancy=1)) == (distances <= 1.0).sum(), \
+            "within does not match the full scan"
+
+    start = time.perf_counter()
+    for latitude, longitude in points:
+        locator.nearest(latitude, longitude, k=5, min_vacancy=1)
+    nearest = (time.perf_counter() - start) / queries
+    start = time.perf_counter()
+    for latitude, longitude in points:
+        locator.within(latitude, longitude, 1.0, min_vacancy=1)
+    within = (time.perf_counter() - start) / queries
+    print(f"spatial index of {n} car parks: build {build * 1000:.1f}ms, "
+          f"nearest {nearest * 1000:.3f}ms, within 1km {within * 1000:.3f}ms per query")
+
+
+def bench_tariff(n: int=10000) -> None:
+    """Time compiling the opening hours and the charges, and the bulk open and price queries"""
+    info = generate_payload(n)[0]["results"]
+    start = time.perf_counter()
+    evaluator = TariffEvaluator(info, "privateCar", holidays=["2025-01-01"])
+    compile_time = time.perf_counter() - start
+    start = time.perf_counter()
+    is_open = evaluator.is_open("2025-01-02 08:00")
+    open_time = time.perf_counter() - start
+    start = time.perf_counter()
+    price = evaluator.price("2025-01-02 18:00", "2025-01-02 21:00")
+    price_time = time.perf_counter() - start
+    print(f"tariff of {n} car parks: compile {compile_time:.2f}s, is_open {open_time * 1000:.1f}ms "
+          f"({int(is_open.sum())} open), 3 hour price {price_time * 1000:.1f}ms ({int(price.notna().sum())} priced)")
+
+
+def bench_save_all(n: int=10000, vehicle_types=("privateCar", "LGV", "HGV")) -> None:
+    """Compare building every table separately with building them in one pass, and across processes"""
+    with StubServer(n, vehicle_types=vehicle_types) as server, tempfile.TemporaryDirectory() as destination:
+        scrapers = []
+        for vehicle_type in vehicle_types:
+            scraper = vehicles.CarparkScraper(vehicle_type=vehicle_type, fetcher=FetchCoordinator(base_url=server.url))
+            scraper.get_data(data="info")
+            scraper.get_data(data="vacancy")
+            scrapers.append(scraper)
+
+        start = time.perf_counter()
+        for scraper in scrapers:
+            for info in TABLES:
+                scraper.save_csv(destination=os.path.join(destination, "separate", scraper.vehicle_type), info=info)
+        separate_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for scraper in scrapers:
+            scraper.save_all(destination=os.path.join(destination, "one_pass", scraper.vehicle_type))
+        one_pass_time = time.perf_counter() - start
+        start = time.perf_counter()
+        export_all(os.path.join(destination, "processes"), vehicle_types=vehicle_types, base_url=server.url)
+        process_time = time.perf_counter() - start
+    # The three paths writing the same files is checked in tests/test_export.py
+    print(f"export {len(vehicle_types)} vehicle types of {n} car parks: separate tables {separate_time:.2f}s, "
+          f"one pass {one_pass_time:.2f}s, process pool with fetch {process_time:.2f}s on {os.cpu_count()} cores")
+
+
+def bench_refresh(n: int=5000, watched: int=200, latency: float=0.05) -> None:
+    """Compare a full pull of the vacancy with a targeted refresh of the watched car parks and of an extent"""
+    with StubServer(n, latency=latency) as server:
+        fetcher = FetchCoordinator(base_url=server.url)
+        scraper = vehicles.CarparkScraper(vehicle_type="privateCar", fetcher=fetcher)
+        scraper.get_data(data="info")
+        poller = VacancyPoller("privateCar", fetcher=fetcher)
+        poller.poll()
+        ids = [str(id) for id in random.Random(0).sample(range(1, n + 1), watched)]
+
+        def bytes_downloaded():
+            return sum(value for (name, _), value in fetcher.metrics.counters.items() if name == "http_bytes_total")
+
+        for label, refresh in (
+            ("full pull", lambda: scraper.get_data(data="vacancy")),
+            (f"{watched} park ids", lambda: scraper.refresh(park_ids=ids)),
+            ("extent of 1/16", lambda: scraper.refresh(extent="113.9,22.2,114.0,22.275", tiles=(2, 2))),
+            (f"poller {watched} park ids", lambda: poller.refresh(park_ids=ids))
+        ):
+            downloaded = bytes_downloaded()
+            start = time.perf_counter()
+            refresh()
+            print(f"{label}: {time.perf_counter() - start:.3f}s, {(bytes_downloaded() - downloaded) / 1024:.0f}KB")
+
+        expected = {record["park_Id"]: record.get("privateCar") for record in server.records[("vacancy", "privateCar")]}
+        for id in ids:
+            vacancy = expected[id][0]["vacancy"] if expected[id] else None
+            assert (scraper.get_vacancy(id) or {}).get("vacancy") == vacancy, f"{id} was not merged"
+            assert (poller.snapshot.get(id) or {}).get("vacancy", None) == vacancy, f"{id} was not merged in the snapshot"
+        assert len(scraper.park_ids) == n
+
+
+def bench_multilingual(n: int=5000, langs=("zh_TW", "en_US", "zh_CN")) -> None:
+    """Compare three scrapers of one language each with the multilingual scraper, and check their localized columns"""
+    with StubServer(n) as server:
+        fetcher = FetchCoordinator(base_url=server.url)
+        start = time.perf_counter()
+        scrapers = {}
+        for lang in langs:
+            scrapers[lang] = vehicles.CarparkScraper(vehicle_type="privateCar", lang=lang, fetcher=fetcher)
+            scrapers[lang].get_data(data="info")
+        infos = [info for info in TABLES if info != "vacancy"]
+        separate_tables = {(lang, info): scrapers[lang].get_table(info=info) for lang in langs for info in infos}
+        separate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        multilingual = MultilingualScraper("privateCar", langs=langs, fetcher=fetcher)
+        multilingual.get_data(data="info")
+        tables = multilingual.build_tables(infos=infos)
+        multilingual_time = time.perf_counter() - start
+
+    for info in LOCALIZED_TABLES:
+        for lang in langs:
+            separate = separate_tables[(lang, info)]
+            for col in separate.columns:
+                if f"{col}_{lang}" in tables[info].columns:
+                    assert (tables[info][f"{col}_{lang}"].astype(str).to_numpy() == separate[col].astype(str).to_numpy()).all(), \
+                        f"{info} {col} {lang} differs"
+    separate_bytes = sum(table.memory_usage(deep=True).sum() for table in separate_tables.values() if not table is None)
+    multilingual_bytes = sum(table.memory_usage(deep=True).sum() for table in tables.values() if not table is None)
+    print(f"{len(langs)} languages of {n} car parks: separate {separate_time:.2f}s {separate_bytes / 1024 ** 2:.1f}MB, "
+          f"multilingual {multilingual_time:.2f}s {multilingual_bytes / 1024 ** 2:.1f}MB")
+
+
+def suite_cases(scraper: vehicles.CarparkScraper, destination: str) -> dict:
+    """Calls of every public method and export path of a loaded scraper, keyed by name"""
+    park_ids = list(scraper.park_ids)
+    info_ids = [record["park_Id"] for record in scraper.info]
+
+    def per_id(accessor, ids, **kwargs):
+        return lambda: [accessor(park_id=id, **kwargs) for id in ids]
+
+    cases = {
+        "get_data[info]": lambda: scraper.get_data(data="info"),
+        "get_data[vacancy]": lambda: scraper.get_data(data="vacancy"),
+        "get_carpark": per_id(scraper.get_carpark, info_ids),
+        "get_vacancy": per_id(scraper.get_vacancy, park_ids),
+        "get_basic_info": per_id(scraper.get_basic_info, info_ids),
+        "get_address": per_id(scraper.get_address, info_ids),
+        "get_grace_periods": per_id(scraper.get_grace_periods, info_ids),
+        "get_height_limits": per_id(scraper.get_height_limits, info_ids),
+        "get_opening_hours": per_id(scraper.get_opening_hours, info_ids)
+    }
+    for mode in ("privileges", "monthlyCharges", "hourlyCharges", "dayNightParks", "unloadings"):
+        cases[f"get_charges[{mode}]"] = per_id(scraper.get_charges, info_ids, mode=mode)
+    for info in TABLES:
+        cases[f"get_table[{info}]"] = lambda info=info: scraper.get_table(info=info)
+    cases["build_tables"] = lambda: scraper.build_tables()
+    cases["memory_report"] = lambda: scraper.memory_report()
+    cases["get_changes[vacancy]"] = lambda: scraper.get_changes(info="vacancy")
+    for info in TABLES:
+        cases[f"save_csv[{info}]"] = lambda info=info: scraper.save_csv(os.path.join(destination, "csv"), info=info)
+        cases[f"save_sqlite[{info}]"] = lambda info=info: scraper.save_sqlite(os.path.join(destination, "sqlite"), info=info)
+        cases[f"save_parquet[{info}]"] = lambda info=info: scraper.save_parquet(os.path.join(destination, "parquet"), info=info)
+    cases["save_sqlite[vacancy, incremental]"] = lambda: scraper.save_sqlite(
+        os.path.join(destination, "sqlite"), info="vacancy", incremental=True)
+    cases["save_all[csv]"] = lambda: scraper.save_all(os.path.join(destination, "all"))
+    cases["save_csv_stream"] = lambda: scraper.save_csv_stream(os.path.join(destination, "stream"))
+
+    poller = VacancyPoller(scraper.vehicle_type, fetcher=scraper.fetcher)
+    store = VacancyStore(os.path.join(destination, "history"), scraper.vehicle_type)
+    cases["VacancyPoller.poll"] = poller.poll
+    cases["VacancyStore.append_snapshot"] = lambda: store.append_snapshot(poller.snapshot or poller.poll())
+    cases["CarparkLocator.from_scraper"] = lambda: CarparkLocator.from_scraper(scraper)
+    cases["TariffEvaluator.from_scraper"] = lambda: TariffEvaluator.from_scraper(scraper, holidays=["2025-01-01"])
+    return cases
+
+
+def measure(function, repeat: int=3, memory: bool=True) -> tuple:
+    """Best wall time in seconds of repeat calls, and the peak memory in bytes of one more traced call"""
+    wall = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        wall = min(wall, time.perf_counter() - start)
+    peak = np.nan
+    if memory:
+        # Tracing slows the call down, so it is left out of the wall time
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return wall, peak
+
+
+def run_suite(sizes=SUITE_SIZES, repeat: int=3, memory: bool=True, only: str=None) -> pd.DataFrame:
+    """
+    Time every case of suite_cases at each number of car parks against the local stub server
+    only keeps the cases whose name contains it. Returns the wall time and peak memory of each case.
+    """
+    results = []
+    for n in sizes:
+        with StubServer(n) as server, tempfile.TemporaryDirectory() as destination:
+            scraper = vehicles.CarparkScraper(vehicle_type="privateCar", fetcher=FetchCoordinator(base_url=server.url))
+            scraper.get_data(data="info")
+            scraper.get_data(data="vacancy")
+            for name, function in suite_cases(scraper, destination).items():
+                if not only is None and not only in name:
+                    continue
+                wall, peak = measure(function, repeat=repeat, memory=memory)
+                results.append({"case": name, "carparks": n, "wall_s": wall, "peak_mb": peak / 1024 ** 2})
+                print(f"{name} @ {n}: {wall:.4f}s" + (f", peak {peak / 1024 ** 2:.1f}MB" if memory else ""))
+    return pd.DataFrame(results)
+
+
+def compare(results: pd.DataFrame, baseline: pd.DataFrame, threshold: float=1.2) -> pd.DataFrame:
+    """Join the results with a baseline run and flag the cases slower than threshold times the baseline"""
+    comparison = results.merge(baseline, on=["case", "carparks"], suffixes=("", "_baseline"))
+    comparison["ratio"] = comparison["wall_s"] / comparison["wall_s_baseline"]
+    comparison["regression"] = comparison["ratio"] > threshold
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the scraper against a local stub of the API")
+    parser.add_argument("--suite", action="store_true", help="run the suite of every public method and export path")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES, help="numbers of car parks of the suite")
+    parser.add_argument("--repeat", type=int, default=3, help="calls per case, the best wall time is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced call measuring peak memory")
+    parser.add_argument("--only", help="only run the cases whose name contains this")
+    parser.add_argument("--output", help="csv to save the results of the suite")
+    parser.add_argument("--baseline", help="csv of an earlier suite run to compare the wall times against")
+    args = parser.parse_args()
+
+    if args.suite:
+        results = run_suite(sizes=args.sizes, repeat=args.repeat, memory=not args.no_memory, only=args.only)
+        if args.output:
+            results.to_csv(args.output, index=False)
+        if args.baseline:
+            comparison = compare(results, pd.read_csv(args.baseline))
+            print(comparison.to_string(index=False))
+            if comparison["regression"].any():
+                raise SystemExit(f"{int(comparison['regression'].sum())} cases regressed")
+    else:
+        bench_get_table()
+        bench_fetch_all()
+        bench_export()
+        bench_cache()
+        bench_stream()
+        bench_spatial()
+        bench_tariff()
+        bench_save_all()
+        bench_refresh()
+        bench_multilingual()
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+
+# Seconds a cached response is used without asking the API, vacancy is always revalidated
+DEFAULT_TTL = {"info": 24 * 3600, "vacancy": 0}
+
+
+class CacheEntry:
+    """Raw response body of a query with the validators of the API"""
+    def __init__(self, body: bytes, etag: str=None, last_modified: str=None, fetched_at: float=None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def conditional_headers(self) -> dict:
+        """Headers to revalidate the entry, the API answers 304 if it is unchanged"""
+        headers = {}
+        if not self.etag is None:
+            headers["If-None-Match"] = self.etag
+        if not self.last_modified is None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Cache of the raw JSON responses on disk, keyed by the full query
+    ttl is the number of seconds an entry is fresh, either one number or a dict keyed by data.
+    Entries older than max_age are evicted, and the oldest entries are evicted once the cache
+    holds more than max_bytes.
+    """
+    def __init__(self, directory: str, ttl=DEFAULT_TTL, max_age: float=7 * 24 * 3600, max_bytes: int=512 * 1024 ** 2):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Make the desired directory and continue if the desired directory already exists
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, params: dict) -> str:
+        """Key of the query, the order of the parameters does not matter"""
+        return hashlib.sha256(urlencode(sorted(params.items())).encode("utf-8")).hexdigest()
+
+    def paths(self, params: dict) -> tuple:
+        """Paths of the body and the metadata of the query"""
+        key = self.key(params)
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.meta")
+
+    def ttl_of(self, params: dict) -> float:
+        """TTL of the data of the query"""
+        if isinstance(self.ttl, dict):
+            return self.ttl.get(params.get("data"), 0)
+        return self.ttl
+
+    def is_fresh(self, params: dict, entry: CacheEntry) -> bool:
+        """Check if the entry can be used without asking the API"""
+        return entry.age < self.ttl_of(params)
+
+    def get(self, params: dict, read_body: bool=True) -> CacheEntry:
+        """Get the entry of the query, None if it is not cached or too old. The body is left on disk without read_body"""
+        body_path, meta_path = self.paths(params)
+        body = None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if read_body:
+                with open(body_path, "rb") as f:
+                    body = f.read()
+            elif not os.path.exists(body_path):
+                return None
+        except (OSError, ValueError):
+            return None
+        entry = CacheEntry(body, etag=meta.get("etag"), last_modified=meta.get("last_modified"),
+                           fetched_at=meta.get("fetched_at"))
+        if entry.age > self.max_age:
+            return None
+        return entry
+
+    def write(self, path: str, content: bytes) -> None:
+        """Write the file atomically so readers never see a partial file"""
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def put(self, params: dict, body: bytes, headers: dict) -> CacheEntry:
+        """Store the response of the query"""
+        headers = {name.lower(): value for name, value in headers.items()}
+        entry = CacheEntry(body, etag=headers.get("etag"), last_modified=headers.get("last-modified"))
+        self.save(params, entry, body=True)
+        self.evict()
+        return entry
+
+    def touch(self, params: dict, entry: CacheEntry) -> CacheEntry:
+        """Mark the entry as fetched now after the API confirmed it is unchanged"""
+        entry.fetched_at = time.time()
+        self.save(params, entry, body=False)
+        return entry
+
+    def save(self, params: dict, entry: CacheEntry, body: bool=True) -> None:
+        """Write the entry, the body is only written again if body is True"""
+        body_path, meta_path = self.paths(params)
+        meta = {
+            "params": params,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "fetched_at": entry.fetched_at
+        }
+        with self.lock:
+            if body:
+                self.write(body_path, entry.body)
+            self.write(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def evict(self) -> None:
+        """Remove the entries older than max_age, then the oldest entries until the cache fits in max_bytes"""
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".meta"):
+                    continue
+                meta_path = os.path.join(self.directory, name)
+                body_path = meta_path[:-len(".meta")] + ".json"
+                try:
+                    entries.append((os.path.getmtime(meta_path), os.path.getsize(body_path), body_path, meta_path))
+                except OSError:
+                    continue
+            entries.sort()
+            total = sum(size for _, size, _, _ in entries)
+            now = time.time()
+            for modified, size, body_path, meta_path in entries:
+                if now - modified <= self.max_age and total <= self.max_bytes:
+                    break
+                for path in (body_path, meta_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+
+    def clear(self) -> None:
+        """Remove all the entries"""
+        with self.lock:
+            for name in os.listdir(self.directory):
+                if name.endswith((".json", ".meta")):
+                    os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,96 @@
+import pandas as pd
+
+
+# Tables which carry a version of each car park, other tables are compared by content
+VERSION_COLUMNS = {
+    "vacancy": ["last_update"],
+    "basic_info": ["modified_date"]
+}
+
+
+class SnapshotDiff:
+    """Rows of the car parks inserted, updated and removed between two snapshots of a table"""
+    def __init__(self, inserted: pd.DataFrame, updated: pd.DataFrame, removed: pd.DataFrame, key: str="park_id"):
+        self.inserted = inserted
+        self.updated = updated
+        self.removed = removed
+        self.key = key
+
+    def __bool__(self) -> bool:
+        return not (self.inserted.empty and self.updated.empty and self.removed.empty)
+
+    def __repr__(self) -> str:
+        return (f"SnapshotDiff(inserted={len(self.inserted)}, updated={len(self.updated)}, "
+                f"removed={len(self.removed)})")
+
+    @property
+    def park_ids(self) -> list:
+        """park_id of all the changed car parks"""
+        return pd.concat([self.inserted[self.key], self.updated[self.key], self.removed[self.key]]).unique().tolist()
+
+    @property
+    def upserts(self) -> pd.DataFrame:
+        """Rows to write for the inserted and updated car parks"""
+        return pd.concat([self.inserted, self.updated], ignore_index=True)
+
+
+def park_hashes(table: pd.DataFrame, key: str="park_id", columns: list=None) -> pd.Series:
+    """Hash the rows of each car park into one value, the order of the rows of a car park counts"""
+    content = table if columns is None else table.loc[:, [key, *columns]]
+    # Lists and dicts are not hashable, compare their string representation instead
+    content = content.astype(str)
+    content["_ordinal"] = table.groupby(key, sort=False).cumcount().astype(str)
+    row_hashes = pd.util.hash_pandas_object(content, index=False)
+    return row_hashes.groupby(table[key].to_numpy(), sort=False).sum()
+
+
+def diff_tables(previous: pd.DataFrame, current: pd.DataFrame, key: str="park_id", columns: list=None) -> SnapshotDiff:
+    """
+    Compare two snapshots of a table by car park
+    columns holds the version columns of the car parks, e.g. last_update, the whole rows are compared if None.
+    The updated rows are all the current rows of the car parks which changed.
+    """
+    if current is None:
+        current = pd.DataFrame(columns=[key])
+    if previous is None or previous.empty:
+        return SnapshotDiff(current, current.iloc[0:0], current.iloc[0:0], key=key)
+
+    previous_hashes = park_hashes(previous, key=key, columns=columns)
+    current_hashes = park_hashes(current, key=key, columns=columns)
+    inserted_ids = current_hashes.index.difference(previous_hashes.index)
+    removed_ids = previous_hashes.index.difference(current_hashes.index)
+    common_ids = current_hashes.index.intersection(previous_hashes.index)
+    updated_ids = common_ids[current_hashes[common_ids].to_numpy() != previous_hashes[common_ids].to_numpy()]
+
+    return SnapshotDiff(
+        inserted=current[current[key].isin(inserted_ids)],
+        updated=current[current[key].isin(updated_ids)],
+        removed=previous[previous[key].isin(removed_ids)],
+        key=key
+    )
+
+
+class ChangeDetector:
+    """Keep the latest snapshot of each table and emit only the changes of every new snapshot"""
+    def __init__(self, key: str="park_id", version_columns: dict=None):
+        self.key = key
+        self.version_columns = VERSION_COLUMNS if version_columns is None else version_columns
+        self.snapshots = {}
+
+    def diff(self, info: str, table: pd.DataFrame, target: str=None) -> SnapshotDiff:
+        """
+        Compare the table with the previous snapshot of the info, the snapshot is kept until commit
+        target separates the snapshots written to different destinations.
+        """
+        previous = self.snapshots.get((target, info))
+        return diff_tables(previous, table, key=self.key, columns=self.version_columns.get(info))
+
+    def commit(self, info: str, table: pd.DataFrame, target: str=None) -> None:
+        """Keep the table as the latest snapshot of the info, once its changes are written"""
+        self.snapshots[(target, info)] = table
+
+    def update(self, info: str, table: pd.DataFrame, target: str=None) -> SnapshotDiff:
+        """Compare the table with the previous snapshot of the info and keep it as the latest snapshot"""
+        changes = self.diff(info, table, target=target)
+        self.commit(info, table, target=target)
+        return changes
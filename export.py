@@ -0,0 +1,48 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from cache import ResponseCache
+from fetcher import API_URL, INPUT_CHOICE, FetchCoordinator
+from vehicles import TABLES, CarparkScraper
+
+
+def export_vehicle_type(vehicle_type: str, destination: str, infos=TABLES, formats=("csv",), lang: str="zh_TW",
+                        cache_directory: str=None, base_url: str=API_URL) -> dict:
+    """
+    Export the tables of one vehicle type from the responses in the cache, run in a worker process
+    Returns the rows of each table.
+    """
+    # The responses were just fetched, so they are used whatever their age
+    fetcher = FetchCoordinator(base_url=base_url, cache=ResponseCache(cache_directory, ttl=float("inf")))
+    scraper = CarparkScraper(vehicle_type=vehicle_type, lang=lang, fetcher=fetcher)
+    scraper.get_data(data="info", lang=lang)
+    scraper.get_data(data="vacancy", lang=lang)
+    tables = scraper.save_all(destination=destination, infos=infos, formats=formats)
+    fetcher.close()
+    return {info: 0 if table is None else len(table) for info, table in tables.items()}
+
+
+def export_all(destination: str, vehicle_types=INPUT_CHOICE["vehicleTypes"], infos=TABLES, formats=("csv",),
+               lang: str="zh_TW", processes: int=None, cache_directory: str=None, base_url: str=API_URL) -> pd.DataFrame:
+    """
+    Export the tables of all vehicle types with one worker process per vehicle type
+    The responses are fetched concurrently into the response cache first, each worker reads its
+    responses from the files of the cache, so no records are pickled between the processes.
+    The tables of each vehicle type are saved in destination/<vehicle_type>. Returns the rows
+    of each table by vehicle type.
+    """
+    with tempfile.TemporaryDirectory() as temp_directory:
+        cache_directory = temp_directory if cache_directory is None else cache_directory
+        fetcher = FetchCoordinator(base_url=base_url, cache=ResponseCache(cache_directory))
+        fetcher.prefetch(vehicle_types=vehicle_types, langs=(lang,))
+        fetcher.close()
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {
+                vehicle_type: executor.submit(export_vehicle_type, vehicle_type, os.path.join(destination, vehicle_type),
+                                              infos, formats, lang, cache_directory, base_url)
+                for vehicle_type in vehicle_types
+            }
+            rows = {vehicle_type: future.result() for vehicle_type, future in futures.items()}
+    return pd.DataFrame(rows).T.rename_axis("vehicle_type")
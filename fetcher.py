@@ -0,0 +1,456 @@
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+from cache import ResponseCache
+from metrics import METRICS, Metrics, logger
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+API_URL = "https://api.data.gov.hk/v1/carpark-info-vacancy"
+INPUT_CHOICE = {
+    "data": ("info", "vacancy"),
+    "vehicleTypes": ("privateCar", "LGV", "HGV", "CV", "coach", "motorCycle"),
+    "lang": ("en_US", "zh_TW", "zh_CN")
+}
+
+Response = namedtuple("Response", ["status", "headers", "body"])
+
+
+def check_input(data: str, vehicle_type: str, lang: str) -> None:
+    """Validate the input of params"""
+    if not data in INPUT_CHOICE["data"]:
+        raise ValueError(f"Input should be one of {INPUT_CHOICE['data']}. Got {data}.")
+    if not vehicle_type in INPUT_CHOICE["vehicleTypes"]:
+        raise ValueError(f"Input should be one of {INPUT_CHOICE['vehicleTypes']}. Got {vehicle_type}.")
+    if not lang in INPUT_CHOICE["lang"]:
+        raise ValueError(f"Input should be one of {INPUT_CHOICE['lang']}. Got {lang}.")
+
+
+def build_params(data: str, vehicle_type: str, lang: str, carpark_id=None, extent=None) -> dict:
+    """Build the query parameters of the API"""
+    check_input(data=data, vehicle_type=vehicle_type, lang=lang)
+    params = {
+        "data": data,
+        "vehicleTypes": vehicle_type,
+        "lang": lang
+    }
+    if not carpark_id is None:
+        params["carparkIds"] = carpark_id
+    if not extent is None:
+        params["extent"] = extent
+    return params
+
+
+def split_extent(extent, tiles=(1, 1)) -> list:
+    """
+    Split the bounding box "minX,minY,maxX,maxY" in longitude and latitude into a grid of tiles
+    Takes the string of the API or a tuple, returns the extent of each tile as the string of the API.
+    """
+    if isinstance(extent, str):
+        extent = [float(value) for value in extent.split(",")]
+    min_x, min_y, max_x, max_y = extent
+    if min_x > max_x or min_y > max_y:
+        raise ValueError(f"Input should be minX,minY,maxX,maxY. Got {extent}.")
+    columns, rows = tiles
+    width, height = (max_x - min_x) / columns, (max_y - min_y) / rows
+    return [
+        ",".join(f"{value:.6f}" for value in (min_x + col * width, min_y + row * height,
+                                               min_x + (col + 1) * width, min_y + (row + 1) * height))
+        for row in range(rows) for col in range(columns)
+    ]
+
+
+class ConnectionPool:
+    """Bounded pool of keep-alive connections to the host of base_url, safe to share between threads"""
+    def __init__(self, base_url: str, max_connections: int=6, timeout: float=30):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_connections)
+
+    def connect(self) -> http.client.HTTPConnection:
+        """Open a new connection to the host"""
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def remaining(self, deadline: float=None) -> float:
+        """Timeout of the next socket operation, the time left before the deadline if it comes first"""
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("request deadline exceeded")
+        return min(self.timeout, remaining)
+
+    @contextmanager
+    def connection(self, path: str, headers: dict=None, deadline: float=None):
+        """
+        Send a GET request on an idle connection and yield its socket and the response to be read by the caller
+        At most max_connections requests are in flight, the connection goes back to the pool afterwards.
+        No socket operation waits beyond deadline, a time of time.monotonic.
+        """
+        headers = {"Connection": "keep-alive", **(headers or {})}
+        with self.slots:
+            try:
+                conn = self.idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self.connect()
+                reused = False
+            try:
+                try:
+                    sock, response = self.send(conn, path, headers, deadline)
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # The server may close an idle connection, retry once on a fresh one
+                    conn.close()
+                    if not reused:
+                        raise
+                    conn = self.connect()
+                    sock, response = self.send(conn, path, headers, deadline)
+                yield sock, response
+                if not (response.will_close or response.isclosed()):
+                    # The body must be read completely before the connection is reused
+                    sock.settimeout(self.remaining(deadline))
+                    response.read()
+            except BaseException:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self.idle.put(conn)
+
+    def send(self, conn: http.client.HTTPConnection, path: str, headers: dict, deadline: float=None) -> tuple:
+        """Send the request on the connection, returns its socket and the response with the headers read"""
+        conn.timeout = self.remaining(deadline)
+        if not conn.sock is None:
+            conn.sock.settimeout(conn.timeout)
+        conn.request("GET", path, headers=headers)
+        # The connection lets go of its socket if the response closes it
+        sock = conn.sock
+        sock.settimeout(self.remaining(deadline))
+        return sock, conn.getresponse()
+
+    @contextmanager
+    def open(self, path: str, headers: dict=None, deadline: float=None):
+        """Send a GET request on an idle connection and yield the response to be read by the caller"""
+        with self.connection(path, headers=headers, deadline=deadline) as (_, response):
+            yield response
+
+    def request(self, path: str, headers: dict=None, deadline: float=None) -> Response:
+        """
+        Send a GET request and read the whole body
+        With a deadline the body is read in chunks, so a response trickling in still stops at the deadline.
+        """
+        with self.connection(path, headers=headers, deadline=deadline) as (sock, response):
+            if deadline is None:
+                body = response.read()
+            else:
+                chunks = []
+                # The response closes the socket once the body of a closing connection is read
+                while not response.isclosed():
+                    sock.settimeout(self.remaining(deadline))
+                    chunk = response.read1(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                body = b"".join(chunks)
+        return Response(response.status, dict(response.getheaders()), body)
+
+    def close(self) -> None:
+        """Close all the idle connections"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class CircuitOpenError(URLError):
+    """Raised without sending the request while the circuit breaker is open"""
+
+
+class RetryPolicy:
+    """
+    Retry failed requests with jittered exponential backoff
+    The delay before retry n is random between 0 and backoff * 2 ** n, capped at max_backoff,
+    so clients failing together do not retry together. deadline is the wall clock budget in seconds
+    of a request with all its attempts, it also stops an attempt whose response trickles in.
+    """
+    def __init__(self, retries: int=3, backoff: float=0.5, max_backoff: float=8, deadline: float=None,
+                 retry_statuses=(429, 500, 502, 503, 504)):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.retry_statuses = retry_statuses
+
+    def delay(self, attempt: int, retry_after: str=None) -> float:
+        """Seconds to wait before the retry after the attempt, at least the Retry-After of the API"""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if not retry_after is None and retry_after.isdigit():
+            delay = max(delay, min(self.max_backoff, int(retry_after)))
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Stop sending requests after failure_threshold failures in a row
+    While open, requests fail at once with CircuitOpenError. After reset_timeout seconds one
+    trial request is let through, its success closes the circuit and its failure opens it again.
+    """
+    def __init__(self, failure_threshold: int=5, reset_timeout: float=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self) -> None:
+        """Raise CircuitOpenError if the request should not be sent"""
+        with self.lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self.trial):
+                raise CircuitOpenError(f"circuit open after {self.failures} failures in a row")
+            if state == "half_open":
+                self.trial = True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class FetchCoordinator:
+    """
+    Fetch the carpark-info-vacancy API through a shared pool of keep-alive connections
+    fetch_all pulls every combination of data, vehicle type and language concurrently.
+    With a cache, fresh responses are served from disk and stale ones are revalidated with
+    a conditional request, so an unchanged response costs a 304 without a body. The latency,
+    status and bytes of every request are recorded in metrics.
+    Every socket operation times out after timeout seconds and a request with its retries after the
+    deadline of retry or of the call. Failed requests are retried by retry
+    and the breaker fails fast while the API keeps failing. Failures raise URLError or HTTPError.
+    """
+    def __init__(self, base_url: str=API_URL, max_connections: int=6, timeout: float=30,
+                 cache: ResponseCache=None, metrics: Metrics=None, retry: RetryPolicy=None,
+                 breaker: CircuitBreaker=None):
+        self.base_url = base_url
+        self.path = urlsplit(base_url).path
+        self.max_connections = max_connections
+        self.pool = ConnectionPool(base_url, max_connections=max_connections, timeout=timeout)
+        self.cache = cache
+        self.metrics = METRICS if metrics is None else metrics
+        self.retry = RetryPolicy() if retry is None else retry
+        self.breaker = CircuitBreaker() if breaker is None else breaker
+
+    def labels(self, params: dict) -> dict:
+        """Labels of the metrics of the query"""
+        return {"data": params.get("data"), "vehicle_type": params.get("vehicleTypes"), "lang": params.get("lang")}
+
+    def url(self, params: dict) -> str:
+        """Full url of the query"""
+        return f"{self.base_url}?{urlencode(params)}"
+
+    def get(self, params: dict, headers: dict=None, deadline: float=None) -> Response:
+        """Send the query and raise HTTPError if the API does not respond with 200, deadline overrides the one of retry"""
+        labels = self.labels(params)
+        entry = None
+        if not self.cache is None:
+            entry = self.cache.get(params)
+            if not entry is None:
+                if self.cache.is_fresh(params, entry):
+                    self.metrics.increment("http_requests_total", status="cache_hit", **labels)
+                    return Response(200, {"X-Cache": "hit"}, entry.body)
+                headers = {**entry.conditional_headers(), **(headers or {})}
+
+        response = self.request(params, headers=headers, deadline=deadline)
+        if response.status == 304 and not entry is None:
+            # The API confirmed the cached response is unchanged
+            self.cache.touch(params, entry)
+            return Response(200, {**response.headers, "X-Cache": "revalidated"}, entry.body)
+        if response.status != 200:
+            raise HTTPError(self.url(params), response.status, response.body.decode("utf-8", "replace"),
+                            response.headers, None)
+        if not self.cache is None:
+            self.cache.put(params, response.body, response.headers)
+        return response
+
+    def request(self, params: dict, headers: dict=None, deadline: float=None) -> Response:
+        """
+        Send the query to the API, retrying timeouts, dropped connections and the retry statuses
+        Raises URLError once the retries or the deadline in seconds are used up, or CircuitOpenError while
+        the breaker is open. deadline overrides the one of retry.
+        """
+        labels = self.labels(params)
+        start = time.monotonic()
+        deadline = self.retry.deadline if deadline is None else deadline
+        # Every attempt and the read of its body only get the time left of the deadline
+        end = None if deadline is None else start + deadline
+        attempt = 0
+        while True:
+            self.breaker.check()
+            retry_after = None
+            try:
+                with self.metrics.timer("http_request_seconds", **labels):
+                    response = self.pool.request(f"{self.path}?{urlencode(params)}", headers=headers, deadline=end)
+            except (OSError, http.client.HTTPException) as error:
+                # Timeouts and dropped connections
+                self.metrics.increment("http_requests_total", status="error", **labels)
+                failure = error if isinstance(error, URLError) else URLError(error)
+            else:
+                self.metrics.increment("http_requests_total", status=response.status, **labels)
+                self.metrics.increment("http_bytes_total", len(response.body), **labels)
+                if not response.status in self.retry.retry_statuses:
+                    self.breaker.record_success()
+                    return response
+                failure = HTTPError(self.url(params), response.status, response.body.decode("utf-8", "replace"),
+                                    response.headers, None)
+                retry_after = {name.lower(): value for name, value in response.headers.items()}.get("retry-after")
+            self.breaker.record_failure()
+            if attempt >= self.retry.retries:
+                raise failure
+            delay = self.retry.delay(attempt, retry_after)
+            if not end is None and time.monotonic() + delay > end:
+                raise failure
+            self.metrics.increment("http_retries_total", **labels)
+            logger.warning("Retrying %s of %s in %.2fs after %s", params.get("data"), params.get("vehicleTypes"),
+                           delay, failure)
+            time.sleep(delay)
+            attempt += 1
+
+    def fetch(self, data: str, vehicle_type: str, lang: str="zh_TW", carpark_id=None, extent=None,
+              deadline: float=None) -> list:
+        """Fetch the results of one query, within deadline seconds if given"""
+        params = build_params(data=data, vehicle_type=vehicle_type, lang=lang, carpark_id=carpark_id, extent=extent)
+        response = self.get(params, deadline=deadline)
+        return json.loads(response.body.decode("utf-8"))["results"]
+
+    def fetch_targeted(self, data: str, vehicle_type: str, lang: str="zh_TW", park_ids=None, extent=None,
+                       batch_size: int=50, tiles=(1, 1), deadline: float=None) -> list:
+        """
+        Fetch only the car parks of park_ids or inside the bounding box extent
+        park_ids are split into carparkIds batches of batch_size and the extent into a grid of tiles,
+        the queries run concurrently, each within deadline seconds if given. Returns the results with each car park once.
+        """
+        if park_ids is None and extent is None:
+            raise ValueError("Input should have park_ids or extent. Got neither.")
+        queries = []
+        if not park_ids is None:
+            park_ids = list(dict.fromkeys(str(park_id) for park_id in park_ids))
+            queries += [{"carpark_id": ",".join(park_ids[start:start + batch_size])}
+                        for start in range(0, len(park_ids), batch_size)]
+        if not extent is None:
+            queries += [{"extent": tile} for tile in split_extent(extent, tiles)]
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            batches = executor.map(lambda query: self.fetch(data, vehicle_type, lang, deadline=deadline, **query), queries)
+            # Car parks on the border of two tiles are returned by both
+            results = {}
+            for batch in batches:
+                results.update((str(record["park_Id"]), record) for record in batch)
+        self.metrics.increment("targeted_queries_total", len(queries), data=data, vehicle_type=vehicle_type)
+        return list(results.values())
+
+    def stream(self, data: str, vehicle_type: str, lang: str="zh_TW", carpark_id=None, extent=None):
+        """
+        Yield the records of the results one by one while the response is parsed with ijson
+        Only the record being parsed is held in memory. A fresh cached response is streamed from disk,
+        responses streamed from the API are not written to the cache.
+        """
+        if ijson is None:
+            raise ImportError("Streaming the results needs ijson, install it with: pip install ijson")
+        params = build_params(data=data, vehicle_type=vehicle_type, lang=lang, carpark_id=carpark_id, extent=extent)
+        if not self.cache is None:
+            entry = self.cache.get(params, read_body=False)
+            if not entry is None and self.cache.is_fresh(params, entry):
+                with open(self.cache.paths(params)[0], "rb") as f:
+                    yield from ijson.items(f, "results.item", use_float=True)
+                return
+
+        labels = self.labels(params)
+        # A stream cannot be retried halfway, but it does not add to an API which keeps failing
+        self.breaker.check()
+        try:
+            with self.pool.open(f"{self.path}?{urlencode(params)}") as response:
+                self.metrics.increment("http_requests_total", status=response.status, **labels)
+                if response.status in self.retry.retry_statuses:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status != 200:
+                    raise HTTPError(self.url(params), response.status, response.read().decode("utf-8", "replace"),
+                                    dict(response.getheaders()), None)
+                records = 0
+                try:
+                    for record in ijson.items(response, "results.item", use_float=True):
+                        records += 1
+                        yield record
+                finally:
+                    self.metrics.increment("stream_records_total", records, **labels)
+        except HTTPError:
+            raise
+        except (OSError, http.client.HTTPException):
+            # Timeouts and dropped connections
+            self.breaker.record_failure()
+            raise
+
+    def fetch_all(self, data=INPUT_CHOICE["data"], vehicle_types=INPUT_CHOICE["vehicleTypes"],
+                  langs=("zh_TW",)) -> dict:
+        """
+        Fetch every combination of data, vehicle type and language concurrently
+        Returns the results keyed by (data, vehicle_type, lang), which CarparkScraper takes through
+        its info argument and load_data.
+        """
+        queries = [(d, vehicle_type, lang) for d in data for vehicle_type in vehicle_types for lang in langs]
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            futures = {query: executor.submit(self.fetch, *query) for query in queries}
+            return {query: future.result() for query, future in futures.items()}
+
+    def prefetch(self, data=INPUT_CHOICE["data"], vehicle_types=INPUT_CHOICE["vehicleTypes"],
+                 langs=("zh_TW",)) -> list:
+        """Fetch every combination concurrently into the cache without parsing the responses, returns the params"""
+        if self.cache is None:
+            raise ValueError("Prefetching needs a cache to keep the responses.")
+        queries = [build_params(data=d, vehicle_type=vehicle_type, lang=lang)
+                   for d in data for vehicle_type in vehicle_types for lang in langs]
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            list(executor.map(self.get, queries))
+        return queries
+
+    def close(self) -> None:
+        """Close the connections of the pool"""
+        self.pool.close()
@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+
+# Mix of the requests by route
+DEFAULT_MIX = {"vacancy": 0.1, "carpark": 0.6, "nearby": 0.3}
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, path: str) -> tuple:
+    """Send a GET on the keep-alive connection, returns the status and the body"""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+def make_paths(vacancy: dict, n: int, mix: dict=DEFAULT_MIX, seed: int=0) -> list:
+    """Random request paths of the mix, the car parks are taken from the body of /vacancy"""
+    rng = random.Random(seed)
+    park_ids = [result["park_id"] for result in vacancy["results"]]
+    routes = rng.choices(list(mix), weights=list(mix.values()), k=n)
+    paths = []
+    for route in routes:
+        if route == "vacancy":
+            paths.append("/vacancy")
+        elif route == "carpark":
+            paths.append(f"/carpark/{rng.choice(park_ids)}")
+        else:
+            # Around Hong Kong Island and Kowloon
+            paths.append(f"/nearby?lat={rng.uniform(22.25, 22.40):.5f}&lon={rng.uniform(114.10, 114.25):.5f}&k=5")
+    return paths
+
+
+async def worker(host: str, port: int, paths: list, latencies: list, statuses: dict) -> None:
+    """Send the paths one after another on one connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, host, path)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def load_test(url: str, requests: int=10000, connections: int=50, mix: dict=DEFAULT_MIX) -> dict:
+    """Send the requests over the concurrent keep-alive connections, returns the throughput and latency percentiles"""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    reader, writer = await asyncio.open_connection(host, port)
+    status, body = await request(reader, writer, host, "/vacancy")
+    writer.close()
+    if status != 200:
+        raise ValueError(f"Input should be a service with a vacancy. Got status {status}.")
+    paths = make_paths(json.loads(body), requests, mix=mix)
+
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(host, port, paths[i::connections], latencies, statuses) for i in range(connections)))
+    seconds = time.perf_counter() - start
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "connections": connections,
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p90_ms": float(np.percentile(latencies, 90)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "statuses": statuses
+    }
+
+
+async def wait_ready(url: str, timeout: float=60) -> None:
+    """Wait until the service answers /vacancy"""
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+            status, _ = await request(reader, writer, parts.hostname, "/vacancy")
+            writer.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{url} was not ready in {timeout}s.")
+        await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the car park service")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="url of a running service")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--stub", type=int, default=None,
+                        help="start a service over a local stub API with this many car parks instead of using --url")
+    parser.add_argument("--port", type=int, default=8765, help="port of the service started with --stub")
+    args = parser.parse_args()
+
+    if args.stub is None:
+        print(json.dumps(asyncio.run(load_test(args.url, args.requests, args.connections)), indent=2))
+    else:
+        from stub_api import StubServer
+
+        url = f"http://127.0.0.1:{args.port}"
+        with StubServer(n=args.stub) as stub:
+            # The service runs in its own process so it does not share the interpreter with the clients
+            service = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "service.py"),
+                                        "--base-url", stub.url, "--port", str(args.port)])
+            try:
+                asyncio.run(wait_ready(url))
+                upstream = stub.requests
+                results = asyncio.run(load_test(url, args.requests, args.connections))
+                results["upstream_requests"] = stub.requests - upstream
+                print(json.dumps(results, indent=2))
+            finally:
+                service.terminate()
+                service.wait()
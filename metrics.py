@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("carpark")
+
+
+def configure_logging(level=logging.INFO, fmt: str="%(asctime)s %(levelname)s %(name)s: %(message)s") -> None:
+    """Log the stages of the scraper to stderr at the level, DEBUG also logs the timing of every stage"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(fmt))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+def label_key(labels: dict) -> tuple:
+    """Hashable key of the labels, missing labels are left out"""
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if not value is None))
+
+
+class Metrics:
+    """
+    Counters and timings of the stages, keyed by name and labels such as table and vehicle_type
+    Timings keep the count, sum and max of the seconds. Safe to share between threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+
+    def increment(self, name: str, value: float=1, **labels) -> None:
+        """Add the value to the counter"""
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record one timing of the stage"""
+        key = (name, label_key(labels))
+        with self.lock:
+            count, total, maximum = self.timings.get(key, (0, 0.0, 0.0))
+            self.timings[key] = (count + 1, total + seconds, max(maximum, seconds))
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time the block as the stage, the timing is also logged at DEBUG"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(name, seconds, **labels)
+            logger.debug("%s %s took %.4fs", name, dict(label_key(labels)), seconds)
+
+    def to_dict(self) -> dict:
+        """Get the counters and the timings as a dict keyed by name and labels"""
+        with self.lock:
+            metrics = {}
+            for (name, labels), value in self.counters.items():
+                metrics.setdefault(name, {})[labels] = value
+            for (name, labels), (count, total, maximum) in self.timings.items():
+                metrics.setdefault(name, {})[labels] = {"count": count, "sum": total, "max": maximum}
+            return metrics
+
+    def to_prometheus(self, prefix: str="carpark") -> str:
+        """Format the metrics in the Prometheus text format, timings become summaries with _count, _sum and _max"""
+        def series(name, labels, value):
+            label_text = ",".join(f'{label}="{str(text).replace(chr(34), chr(39))}"' for label, text in labels)
+            return f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}"
+
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timings = sorted(self.timings.items())
+        for name in dict.fromkeys(name for (name, _), _ in counters):
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            lines.extend(series(f"{prefix}_{name}", labels, value) for (metric, labels), value in counters if metric == name)
+        for name in dict.fromkeys(name for (name, _), _ in timings):
+            lines.append(f"# TYPE {prefix}_{name} summary")
+            for (metric, labels), (count, total, maximum) in timings:
+                if metric == name:
+                    lines.append(series(f"{prefix}_{name}_count", labels, count))
+                    lines.append(series(f"{prefix}_{name}_sum", labels, total))
+                    lines.append(series(f"{prefix}_{name}_max", labels, maximum))
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str, prefix: str="carpark") -> None:
+        """Write the metrics for the textfile collector of the node exporter, atomically so it never reads a partial file"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(prefix=prefix))
+        os.replace(temp_path, path)
+
+    def reset(self) -> None:
+        """Clear all the metrics"""
+        with self.lock:
+            self.counters.clear()
+            self.timings.clear()
+
+
+# Metrics shared by the scraper, the fetcher and the poller unless they are given their own
+METRICS = Metrics()
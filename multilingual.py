@@ -0,0 +1,102 @@
+import pandas as pd
+from fetcher import INPUT_CHOICE, FetchCoordinator
+from normalize import LOCALIZED_COLUMNS, TABLE_COLUMNS, TableNormalizer
+from schema import downcast
+from vehicles import TABLES, CarparkScraper
+
+
+# Tables holding any localized column
+LOCALIZED_TABLES = tuple(info for info in TABLES if any(col in LOCALIZED_COLUMNS for col in TABLE_COLUMNS[info]))
+
+
+def row_keys(table: pd.DataFrame) -> pd.MultiIndex:
+    """Key of each row by park_id and its position among the rows of the car park, the same in every language"""
+    park_ids = table["park_id"].astype(str)
+    return pd.MultiIndex.from_arrays([park_ids.to_numpy(), park_ids.groupby(park_ids).cumcount().to_numpy()],
+                                     names=["park_id", "ordinal"])
+
+
+class MultilingualScraper:
+    """
+    Info of a vehicle type in several languages with the language independent fields held once
+    The info of all languages is fetched concurrently. The first language is kept as a CarparkScraper,
+    the other languages only keep their localized columns, e.g. name, address and remark, as compact
+    columns and their records are dropped. get_table joins them as <col>_<lang> columns.
+    """
+    def __init__(self, vehicle_type: str, langs=INPUT_CHOICE["lang"], fetcher: FetchCoordinator=None):
+        langs = tuple(langs)
+        for lang in langs:
+            if not lang in INPUT_CHOICE["lang"]:
+                raise ValueError(f"Input should be one of {INPUT_CHOICE['lang']}. Got {lang}.")
+        if not langs:
+            raise ValueError(f"Input should have at least one of {INPUT_CHOICE['lang']}. Got none.")
+        self.vehicle_type = vehicle_type
+        self.langs = langs
+        self.fetcher = FetchCoordinator() if fetcher is None else fetcher
+        # The scraper of the first language holds the records and the vacancy
+        self.scraper = CarparkScraper(vehicle_type=vehicle_type, lang=langs[0], fetcher=self.fetcher)
+        self.localized = {lang: {} for lang in langs[1:]}
+
+    def get_data(self, data: str="info") -> None:
+        """Fetch the info of all languages concurrently, the vacancy is the same in every language and fetched once"""
+        if data == "vacancy":
+            self.scraper.get_data(data="vacancy")
+            return
+        results = self.fetcher.fetch_all(data=(data,), vehicle_types=(self.vehicle_type,), langs=self.langs)
+        park_ids = self.scraper.park_ids
+        self.scraper.load_data(data="info", results=results[(data, self.vehicle_type, self.langs[0])])
+        if not park_ids is None:
+            # Keep the park_ids of the vacancy if it was fetched first
+            self.scraper.park_ids = park_ids
+        for lang in self.langs[1:]:
+            self.localized[lang] = self.localize(results.pop((data, self.vehicle_type, lang)))
+
+    def localize(self, records: list) -> dict:
+        """Takes in the info records of a language and returns its localized columns of each table"""
+        normalizer = TableNormalizer(records, self.vehicle_type)
+        localized = {}
+        for info in LOCALIZED_TABLES:
+            table = normalizer.table(info)
+            cols = [col for col in LOCALIZED_COLUMNS if col in table.columns]
+            frame = table[cols].set_axis(row_keys(table))
+            # Missing values are "" like the string columns of get_table
+            localized[info] = downcast(frame.astype(object).where(frame.notna(), "").astype("string"))
+        return localized
+
+    def get_table(self, info: str, typed: bool=True, compact: bool=False) -> pd.DataFrame:
+        """Get the table of the first language with a <col>_<lang> column of every language for each localized column"""
+        table = self.scraper.get_table(info=info, typed=typed, compact=compact)
+        if table is None or not info in LOCALIZED_TABLES:
+            return table
+        cols = [col for col in LOCALIZED_COLUMNS if col in table.columns]
+        keys = row_keys(table)
+        columns = {}
+        for col in table.columns:
+            if not col in cols:
+                columns[col] = table[col]
+                continue
+            columns[f"{col}_{self.langs[0]}"] = table[col]
+            for lang in self.langs[1:]:
+                localized = self.localized[lang].get(info)
+                values = pd.Series(pd.NA, index=keys, dtype="string") if localized is None else localized[col].reindex(keys)
+                columns[f"{col}_{lang}"] = values.set_axis(table.index)
+        return pd.DataFrame(columns)
+
+    def build_tables(self, infos=TABLES, typed: bool=True, compact: bool=False) -> dict:
+        """Build the tables with the localized columns of every language, keyed by info"""
+        return {info: self.get_table(info=info, typed=typed, compact=compact) for info in infos}
+
+    def save_all(self, destination: str, infos=TABLES, formats=("csv",)) -> dict:
+        """Save the tables with the localized columns of every language in the formats, returns the tables keyed by info"""
+        savers = {"csv": self.scraper.save_csv, "sqlite": self.scraper.save_sqlite, "parquet": self.scraper.save_parquet}
+        for fmt in formats:
+            if not fmt in savers:
+                raise ValueError(f"Input should be one of {tuple(savers)}. Got {fmt}.")
+        tables = self.build_tables(infos=infos)
+        for info, table in tables.items():
+            # Do not save if the vehicle type has no such information
+            if table is None:
+                continue
+            for fmt in formats:
+                savers[fmt](destination=destination, info=info, table=table)
+        return tables
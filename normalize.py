@@ -0,0 +1,279 @@
+import numpy as np
+import pandas as pd
+
+
+CHARGE_MODES = ("privileges", "monthlyCharges", "hourlyCharges", "dayNightParks", "unloadings")
+
+# Fields of the nested JSON and the column names used in the tables
+BASIC_INFO_FIELDS = {
+    "name": "name",
+    "nature": "nature",
+    "carpark_Type": "carpark_type",
+    "displayAddress": "full_address",
+    "district": "district",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "contactNo": "contact_no",
+    "opening_status": "opening_status",
+    "facilities": "facilities",
+    "paymentMethods": "payment_method",
+    "creationDate": "creation_date",
+    "modifiedDate": "modified_date",
+    "publishedDate": "published_date",
+    "website": "website"
+}
+RENDITION_FIELDS = {
+    "square": "square",
+    "thumbnail": "thumbnail",
+    "banner": "banner",
+    "carpark_photo": "carpark_photo"
+}
+ADDRESS_FIELDS = {
+    "unitNo": "unit_no",
+    "unitDescriptor": "unit_descriptor",
+    "floor": "floor",
+    "blockNo": "block_no",
+    "blockDescriptor": "block_descriptor",
+    "buildingName": "building_name",
+    "phase": "phase",
+    "estateName": "estate_name",
+    "villageName": "village_name",
+    "streetName": "street_name",
+    "buildingNo": "building_no",
+    "subDistrict": "sub_district",
+    "dcDistrict": "dc_district",
+    "region": "region"
+}
+GRACE_PERIOD_FIELDS = {"minutes": "minutes", "remark": "remark"}
+HEIGHT_LIMIT_FIELDS = {"height": "height", "remark": "remark"}
+OPENING_HOUR_FIELDS = {
+    "weekdays": "weekdays",
+    "excludePublicHoliday": "exclude_public_holiday",
+    "periodStart": "period_start",
+    "periodEnd": "period_end"
+}
+VACANCY_FIELDS = {"vacancy_type": "vacancy_type", "vacancy": "vacancy", "lastupdate": "last_update"}
+SPACE_FIELDS = {"space": "space", "spaceDIS": "space_dis", "spaceEV": "space_ev", "spaceUNL": "space_unl"}
+CHARGE_FIELDS = {
+    "privileges": {
+        "excludePublicHoliday": "exclude_public_holiday",
+        "periodStart": "period_start",
+        "periodEnd": "period_end",
+        "description": "description"
+    },
+    "monthlyCharges": {
+        "type": "type",
+        "price": "price",
+        "ranges": "ranges",
+        "covered": "covered",
+        "reserved": "reserved",
+        "remark": "remark"
+    },
+    "hourlyCharges": {
+        "type": "type",
+        "weekdays": "weekdays",
+        "excludePublicHoliday": "exclude_public_holiday",
+        "periodStart": "period_start",
+        "periodEnd": "period_end",
+        "price": "price",
+        "usageThresholds": "usage_thresholds",
+        "covered": "covered",
+        "remark": "remark"
+    },
+    "dayNightParks": {
+        "type": "type",
+        "weekdays": "weekdays",
+        "excludePublicHoliday": "exclude_public_holiday",
+        "periodStart": "period_start",
+        "periodEnd": "period_end",
+        "validUntil": "valid_until",
+        "validUntilEnd": "valid_until_end",
+        "price": "price",
+        "covered": "covered",
+        "remark": "remark"
+    },
+    "unloadings": {
+        "type": "type",
+        "price": "price",
+        "usageThresholds": "usage_thresholds",
+        "remark": "remark"
+    }
+}
+# Columns holding lists in the JSON which the tables keep as their string representation
+STRINGIFIED_COLUMNS = ("weekdays", "facilities", "payment_method")
+# All the columns of each table in order
+TABLE_COLUMNS = {
+    "address": ["park_id", "full_address", *ADDRESS_FIELDS.values()],
+    "basic_info": ["park_id", *BASIC_INFO_FIELDS.values(), *RENDITION_FIELDS.values()],
+    "grace_periods": ["park_id", *GRACE_PERIOD_FIELDS.values()],
+    "height_limits": ["park_id", *HEIGHT_LIMIT_FIELDS.values()],
+    "opening_hours": ["park_id", *OPENING_HOUR_FIELDS.values()],
+    "vacancy": ["park_id", "vehicle_type", *VACANCY_FIELDS.values()],
+    "charges": [
+        "park_id",
+        *dict.fromkeys(col for mode in CHARGE_MODES for col in CHARGE_FIELDS[mode].values()),
+        *SPACE_FIELDS.values()
+    ]
+}
+
+# Columns whose values depend on the lang of the query, the other columns are the same in every language
+LOCALIZED_COLUMNS = (
+    "name", "full_address", "district", "unit_descriptor", "floor", "block_descriptor", "building_name", "phase",
+    "estate_name", "village_name", "street_name", "sub_district", "dc_district", "remark", "description"
+)
+
+
+def chunked(records, chunk_size: int):
+    """Group the records of an iterable into lists of chunk_size records"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stringify(column: pd.Series) -> pd.Series:
+    """Convert the values of the column to string the same way as str(), missing values become "None" """
+    return column.astype(object).where(column.notna(), None).map(str)
+
+
+def select(frame: pd.DataFrame, fields: dict) -> pd.DataFrame:
+    """Select the fields from the frame and rename them, fields missing in the frame are filled with NaN"""
+    selected = frame.reindex(columns=list(fields))
+    selected.columns = list(fields.values())
+    return selected
+
+
+class TableNormalizer:
+    """
+    Flatten the info records of the carpark-info-vacancy API into the tables of CarparkScraper.get_table
+    The records are turned into columns once and the nested dictionaries and lists are expanded
+    with column operations, so each table is built without one dict per carpark.
+    """
+    def __init__(self, records: list, vehicle_type: str, park_ids=None):
+        self.vehicle_type = vehicle_type
+        self.park_ids = [record["park_Id"] for record in records] if park_ids is None else list(park_ids)
+        # One pass over the records to turn the fields of the first level into columns
+        self.frame = pd.DataFrame.from_records(records, index=range(len(records)))
+        self.nested = {}
+
+    def flatten(self, name: str) -> pd.DataFrame:
+        """Expand the column of dictionaries into one column per key, the result is cached"""
+        if not name in self.nested:
+            values = self.column(name)
+            values = values[values.map(lambda value: isinstance(value, dict))]
+            self.nested[name] = pd.DataFrame(values.tolist(), index=values.index).reindex(self.frame.index)
+        return self.nested[name]
+
+    def has(self, name: str) -> bool:
+        """Check if any record has the nested dictionary"""
+        return name in self.frame.columns and self.column(name).map(lambda value: isinstance(value, dict)).any()
+
+    def column(self, name: str) -> pd.Series:
+        """Get the column of the records, nested keys are separated by ".", all values are missing if no record has it"""
+        frame = self.frame
+        if "." in name:
+            name, key = name.split(".", 1)
+            frame = self.flatten(name)
+            name = key
+        if name in frame.columns:
+            return frame[name]
+        return pd.Series(np.nan, index=self.frame.index, dtype=object)
+
+    def select(self, name: str, fields: dict) -> pd.DataFrame:
+        """Select the keys of the nested dictionary and rename them with the fields"""
+        return select(self.flatten(name), fields)
+
+    def explode(self, name: str, fields: dict) -> pd.DataFrame:
+        """Expand the column of lists into one row per element with the fields of the elements as columns"""
+        items = self.column(name).explode()
+        # Missing values and empty lists are exploded into NaN
+        items = items[items.map(lambda item: isinstance(item, dict))]
+        expanded = select(pd.DataFrame(items.tolist(), index=items.index), fields)
+        expanded.insert(0, "park_id", [self.park_ids[position] for position in items.index])
+        return expanded
+
+    def address(self) -> pd.DataFrame:
+        """Table of the address of all car parks"""
+        table = pd.DataFrame({"park_id": self.park_ids, "full_address": self.column("displayAddress")})
+        if self.has("address"):
+            table = pd.concat([table, self.select("address", ADDRESS_FIELDS)], axis=1)
+        return table
+
+    def basic_info(self) -> pd.DataFrame:
+        """Table of the basic information of all car parks"""
+        table = select(self.frame, BASIC_INFO_FIELDS)
+        table.insert(0, "park_id", self.park_ids)
+        for col in STRINGIFIED_COLUMNS:
+            if col in table.columns:
+                table[col] = stringify(table[col])
+        if self.has("renditionUrls"):
+            table = pd.concat([table, self.select("renditionUrls", RENDITION_FIELDS)], axis=1)
+        return table
+
+    def grace_periods(self) -> pd.DataFrame:
+        """Table of the grace periods of all car parks"""
+        return self.explode("gracePeriods", GRACE_PERIOD_FIELDS)
+
+    def height_limits(self) -> pd.DataFrame:
+        """Table of the height limits of all car parks"""
+        return self.explode("heightLimits", HEIGHT_LIMIT_FIELDS)
+
+    def opening_hours(self) -> pd.DataFrame:
+        """Table of the opening hours of all car parks"""
+        table = self.explode("openingHours", OPENING_HOUR_FIELDS)
+        table["weekdays"] = stringify(table["weekdays"])
+        return table
+
+    def charges(self) -> pd.DataFrame:
+        """Table of the charges of the vehicle type in all modes of parking of all car parks"""
+        spaces = self.select(self.vehicle_type, SPACE_FIELDS)
+        tables = []
+        for rank, mode in enumerate(CHARGE_MODES):
+            table = self.explode(f"{self.vehicle_type}.{mode}", CHARGE_FIELDS[mode])
+            if table.empty:
+                continue
+            if "weekdays" in table.columns:
+                table["weekdays"] = stringify(table["weekdays"])
+            if mode == "hourlyCharges":
+                # Only the first usage threshold is kept as string
+                table["usage_thresholds"] = table["usage_thresholds"].map(
+                    lambda thresholds: str(thresholds[0]) if isinstance(thresholds, list) else None)
+            table = pd.concat([table, spaces.loc[table.index]], axis=1)
+            table["_position"] = table.index
+            table["_rank"] = rank
+            tables.append(table)
+        if not tables:
+            return pd.DataFrame()
+        # Columns follow the mode which appears first, rows follow the car parks then the modes
+        tables.sort(key=lambda table: (table["_position"].iloc[0], table["_rank"].iloc[0]))
+        table = pd.concat(tables).sort_values(["_position", "_rank"], kind="stable")
+        return table.drop(columns=["_position", "_rank"]).reset_index(drop=True)
+
+    def table(self, info: str) -> pd.DataFrame:
+        """Get the table of the info, vacancy is not part of the info records"""
+        tables = {
+            "address": self.address,
+            "basic_info": self.basic_info,
+            "grace_periods": self.grace_periods,
+            "height_limits": self.height_limits,
+            "opening_hours": self.opening_hours,
+            "charges": self.charges
+        }
+        if not info in tables:
+            raise ValueError(f"Input should be one of {tuple(tables)}. Got {info}.")
+        return tables[info]().reset_index(drop=True)
+
+
+def normalize_vacancy(park_ids, vacancies: list, vehicle_type: str) -> pd.DataFrame:
+    """Table of the vacancy of the vehicle type, vacancies holds the list of vacancy of each car park or None"""
+    vacancies = pd.Series(vacancies, index=range(len(vacancies)), dtype=object)
+    # Only the first vacancy record of each car park is used
+    latest = vacancies[vacancies.map(lambda item: isinstance(item, list) and len(item) > 0)].str[0]
+    table = select(pd.DataFrame(latest.tolist(), index=latest.index), VACANCY_FIELDS)
+    table.insert(0, "vehicle_type", vehicle_type)
+    table.insert(0, "park_id", [park_ids[position] for position in latest.index])
+    return table.reset_index(drop=True)
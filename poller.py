@@ -0,0 +1,165 @@
+import threading
+import time
+import numpy as np
+from urllib.error import URLError
+from fetcher import FetchCoordinator
+from vehicles import CarparkScraper
+from metrics import logger
+
+
+class VacancySnapshot:
+    """Vacancy of all car parks of one poll, held in arrays with the row of each park_id in position"""
+    def __init__(self, vehicle_type: str, results: list, fetched_at: float=None):
+        self.vehicle_type = vehicle_type
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        park_ids, vacancy_types, vacancies, last_updates = [], [], [], []
+        # One pass over the results, car parks without vacancy of the vehicle type are left out
+        for record in results:
+            entries = record.get(vehicle_type)
+            if not entries:
+                continue
+            entry = entries[0]
+            park_ids.append(str(record["park_Id"]))
+            vacancy_types.append(entry.get("vacancy_type") or "")
+            vacancy = entry.get("vacancy")
+            vacancies.append(-1 if vacancy is None else vacancy)
+            last_updates.append(entry.get("lastupdate") or "NaT")
+        self.park_ids = np.asarray(park_ids, dtype=object)
+        self.vacancy_type = np.asarray(vacancy_types, dtype=str)
+        self.vacancy = np.asarray(vacancies, dtype=np.int32)
+        self.last_update = np.asarray(last_updates, dtype="datetime64[s]")
+        self.position = {park_id: row for row, park_id in enumerate(park_ids)}
+
+    def __len__(self) -> int:
+        return len(self.park_ids)
+
+    def update(self, results: list) -> None:
+        """Merge the results of a targeted refresh, the car parks not in the results keep their vacancy"""
+        partial = VacancySnapshot(self.vehicle_type, results, fetched_at=self.fetched_at)
+        rows = np.asarray([self.position.get(park_id, -1) for park_id in partial.park_ids], dtype=np.int64)
+        known = rows >= 0
+        # Widen the strings so longer vacancy types are not cut
+        self.vacancy_type = self.vacancy_type.astype(np.result_type(self.vacancy_type, partial.vacancy_type))
+        self.vacancy_type[rows[known]] = partial.vacancy_type[known]
+        self.vacancy[rows[known]] = partial.vacancy[known]
+        self.last_update[rows[known]] = partial.last_update[known]
+        if not known.all():
+            new = ~known
+            self.position.update((park_id, len(self.park_ids) + row)
+                                 for row, park_id in enumerate(partial.park_ids[new]))
+            self.park_ids = np.concatenate([self.park_ids, partial.park_ids[new]])
+            self.vacancy_type = np.concatenate([self.vacancy_type, partial.vacancy_type[new]])
+            self.vacancy = np.concatenate([self.vacancy, partial.vacancy[new]])
+            self.last_update = np.concatenate([self.last_update, partial.last_update[new]])
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was fetched"""
+        return time.time() - self.fetched_at
+
+    def __contains__(self, park_id) -> bool:
+        return str(park_id) in self.position
+
+    def get(self, park_id: str) -> dict:
+        """Takes in the park_id and returns the vacancy in the format of CarparkScraper.get_vacancy"""
+        row = self.position.get(str(park_id))
+        if row is None:
+            return None
+        last_update = self.last_update[row]
+        return {
+            "park_id": park_id,
+            "vehicle_type": self.vehicle_type,
+            "vacancy_type": str(self.vacancy_type[row]),
+            "vacancy": int(self.vacancy[row]),
+            "last_update": None if np.isnat(last_update) else str(last_update).replace("T", " ")
+        }
+
+
+class VacancyPoller:
+    """
+    Poll only the vacancy of a vehicle type on a schedule
+    Each poll costs one request and one pass over the results. The static info is left to the
+    scraper, which fetches it on first use only, or takes the info already fetched. A poll with its
+    retries gives up after deadline seconds, below the interval of run, and falls back to the last snapshot.
+    """
+    def __init__(self, vehicle_type: str, lang: str="zh_TW", fetcher: FetchCoordinator=None, info: list=None,
+                 deadline: float=45):
+        self.vehicle_type = vehicle_type
+        self.lang = lang
+        self.fetcher = FetchCoordinator() if fetcher is None else fetcher
+        self.info = info
+        self.deadline = deadline
+        self._scraper = None
+        self.snapshot = None
+        # Polls failed in a row since the last good snapshot
+        self.failures = 0
+
+    @property
+    def scraper(self) -> CarparkScraper:
+        """Scraper of the static info of the car parks, created on first use"""
+        if self._scraper is None:
+            self._scraper = CarparkScraper(vehicle_type=self.vehicle_type, lang=self.lang, info=self.info,
+                                           fetcher=self.fetcher)
+        return self._scraper
+
+    def poll(self, deadline: float=None) -> VacancySnapshot:
+        """
+        Fetch the vacancy once within deadline seconds, the deadline of the poller if None, and keep it as the latest snapshot
+        If the fetch fails, the last good snapshot is returned and the failure is counted in failures,
+        the error is raised if there is no snapshot yet. The age of the snapshot tells how stale it is.
+        """
+        deadline = self.deadline if deadline is None else deadline
+        try:
+            with self.fetcher.metrics.timer("poll_seconds", vehicle_type=self.vehicle_type):
+                results = self.fetcher.fetch(data="vacancy", vehicle_type=self.vehicle_type, lang=self.lang,
+                                             deadline=deadline)
+                snapshot = VacancySnapshot(self.vehicle_type, results)
+        except (URLError, ValueError) as error:
+            self.failures += 1
+            self.fetcher.metrics.increment("poll_errors_total", vehicle_type=self.vehicle_type)
+            if self.snapshot is None:
+                raise
+            logger.warning("Poll of %s failed %d times in a row, keeping the snapshot of %.0fs ago: %s",
+                           self.vehicle_type, self.failures, self.snapshot.age, error)
+            return self.snapshot
+        self.failures = 0
+        self.snapshot = snapshot
+        self.fetcher.metrics.increment("polls_total", vehicle_type=self.vehicle_type)
+        return self.snapshot
+
+    def refresh(self, park_ids=None, extent=None, batch_size: int=50, tiles=(1, 1)) -> VacancySnapshot:
+        """
+        Fetch the vacancy of the car parks of park_ids or inside the bounding box extent only and merge it
+        into the latest snapshot. A full poll is made first if there is no snapshot yet.
+        """
+        if self.snapshot is None:
+            return self.poll()
+        results = self.fetcher.fetch_targeted(data="vacancy", vehicle_type=self.vehicle_type, lang=self.lang,
+                                              park_ids=park_ids, extent=extent, batch_size=batch_size, tiles=tiles,
+                                              deadline=self.deadline)
+        self.snapshot.update(results)
+        return self.snapshot
+
+    def run(self, interval: float=60, callback=None, cycles: int=None, stop: threading.Event=None) -> None:
+        """
+        Poll every interval seconds until stop is set or the number of cycles is reached
+        callback takes in the snapshot of each poll. A poll never takes longer than the interval.
+        """
+        stop = threading.Event() if stop is None else stop
+        cycle = 0
+        next_poll = time.monotonic()
+        while not stop.is_set():
+            try:
+                snapshot = self.poll(deadline=min(self.deadline, interval))
+            except (URLError, ValueError) as error:
+                # Nothing to fall back to before the first good poll, try again on the next cycle
+                logger.error("Poll of %s failed: %s", self.vehicle_type, error)
+                snapshot = None
+            if not callback is None and not snapshot is None:
+                callback(snapshot)
+            cycle += 1
+            if not cycles is None and cycle >= cycles:
+                break
+            # Keep a fixed rate regardless of the time spent in the poll
+            next_poll += interval
+            stop.wait(max(0, next_poll - time.monotonic()))
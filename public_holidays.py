@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from Scraper import Scraper
+from bs4 import BeautifulSoup
+
+
+HOLIDAY_URL = "https://www.gov.hk/en/about/abouthk/holiday/{year}.htm"
+
+
+def parse_holidays(html_content: str, year: int) -> list:
+    """Takes in the holiday page of gov.hk and returns the name, date and weekday of each public holiday"""
+    soup = BeautifulSoup(html_content, features="html.parser")
+    holidays = []
+    for table_row in soup.find_all("table")[0].find_all("tr"):
+        table_data = [td.get_text(strip=True) for td in table_row.find_all("td")]
+        # Header rows and rows without a date are not holidays
+        if len(table_data) < 3 or table_data[1] == "":
+            continue
+        name, date, weekday = table_data[:3]
+        holidays.append({
+            "name": name,
+            "date": datetime.strptime(f"{date} {year}", "%d %B %Y").strftime("%Y-%m-%d"),
+            "weekday": weekday
+        })
+    return holidays
+
+
+class HolidayCalendar:
+    """
+    Public holidays of Hong Kong, each year is parsed once and kept in directory as {year}.json
+    A year is read from its JSON, else from a saved page {year}.htm, else fetched from gov.hk unless
+    offline. dates makes a fixed calendar of those dates which never loads a year.
+    """
+    def __init__(self, directory: str="./holidays", url: str=HOLIDAY_URL, offline: bool=False, dates=None):
+        self.directory = directory
+        self.url = url
+        self.offline = offline
+        self.fixed = not dates is None
+        self.lock = threading.Lock()
+        self.years = set()
+        self.names = {}
+        self.dates = np.unique(np.asarray([] if dates is None else dates, dtype="datetime64[D]"))
+        self.date_set = set(self.dates.tolist())
+
+    def path(self, year: int, extension: str="json") -> str:
+        """Path of the holidays of the year"""
+        return os.path.join(self.directory, f"{year}.{extension}")
+
+    def read(self, year: int) -> list:
+        """Read the holidays of the year from disk, or fetch and save them"""
+        if os.path.exists(self.path(year)):
+            with open(self.path(year), "r", encoding="utf-8") as f:
+                return json.load(f)["holidays"]
+        if os.path.exists(self.path(year, "htm")):
+            with open(self.path(year, "htm"), "r", encoding="utf-8") as f:
+                holidays = parse_holidays(f.read(), year)
+        elif self.offline:
+            raise FileNotFoundError(f"No saved holidays of {year} in {self.directory}.")
+        else:
+            holidays = parse_holidays(Scraper(url=self.url.format(year=year), decode="utf-8").openurl(), year)
+        # Make the desired directory and continue if the desired directory already exists
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(year), "w", encoding="utf-8") as f:
+            json.dump({"year": year, "holidays": holidays}, f, ensure_ascii=False, indent=1)
+        return holidays
+
+    def load(self, year: int) -> None:
+        """Load the holidays of the year once"""
+        year = int(year)
+        if self.fixed or year in self.years:
+            return
+        with self.lock:
+            if year in self.years:
+                return
+            holidays = self.read(year)
+            self.names.update({np.datetime64(holiday["date"], "D"): holiday["name"] for holiday in holidays})
+            self.dates = np.unique(np.concatenate([self.dates, np.asarray(
+                [holiday["date"] for holiday in holidays], dtype="datetime64[D]")]))
+            self.date_set = set(self.dates.tolist())
+            self.years.add(year)
+
+    def holidays(self, year: int) -> pd.DataFrame:
+        """Takes in the year and returns the date and name of each public holiday"""
+        self.load(year)
+        dates = self.dates[self.dates.astype("datetime64[Y]").astype(int) + 1970 == int(year)]
+        return pd.DataFrame({"date": dates, "name": [self.names.get(date) for date in dates]})
+
+    def is_holiday(self, date):
+        """Check if the date is a public holiday. Takes a single date, or an array of dates and returns an array"""
+        if np.ndim(date) == 0:
+            day = np.datetime64(pd.Timestamp(date).date(), "D")
+            self.load(day.astype("datetime64[Y]").astype(int) + 1970)
+            return day.item() in self.date_set
+        days = np.asarray(pd.to_datetime(np.asarray(date).ravel()).values.astype("datetime64[D]")).reshape(np.shape(date))
+        for year in np.unique(days[~np.isnat(days)].astype("datetime64[Y]").astype(int) + 1970):
+            self.load(year)
+        return np.isin(days, self.dates)
@@ -0,0 +1,155 @@
+import pandas as pd
+
+
+# Define the datatype of the columns of the tables
+DATATYPES = {
+    "park_id": "string",
+    "type": "category",
+    "weekdays": "string",
+    "exclude_public_holiday": bool,
+    "period_start": "string",
+    "period_end": "string",
+    "price": "Int64",
+    "usage_thresholds": "string",
+    "covered": "category",
+    "remark": "string",
+    "space": "Int64",
+    "space_dis": "Int64",
+    "space_ev": "Int64",
+    "space_unl": "Int64",
+    "description": "string",
+    "ranges": "string",
+    "reserved": "category",
+    "valid_until": "category",
+    "valid_until_end": "string",
+    "full_address": "string",
+    "unit_no": "string",
+    "unit_descriptor": "string",
+    "floor": "category",
+    "block_no": "string",
+    "block_descriptor": "string",
+    "building_name": "string",
+    "phase": "string",
+    "estate_name": "string",
+    "village_name": "string",
+    "street_name": "string",
+    "building_no": "Int64",
+    "sub_district": "string",
+    "dc_district": "string",
+    "region": "string",
+    "height": "float16",
+    "minutes": "Int16",
+    "name": "string",
+    "nature": "category",
+    "carpark_type": "category",
+    "district": "category",
+    "latitude": "float64",
+    "longitude": "float64",
+    "contact_no": "string",
+    "opening_status": "category",
+    "facilities": "category",
+    "payment_method": "category",
+    "website": "string",
+    "square": "string",
+    "thumbnail": "string",
+    "banner": "string",
+    "carpark_photo": "string",
+    "vehicle_type": "category",
+    "vacancy_type": "string",
+    "vacancy": "int16",
+    "last_update": "string",
+    "creation_date": "datetime64[ns]",
+    "modified_date": "datetime64[ns]",
+    "published_date": "datetime64[ns]"
+}
+# Nullable equivalents of the datatypes which cannot hold missing values
+NULLABLE_DATATYPES = {bool: "boolean", "int16": "Int16"}
+
+
+class SchemaError(ValueError):
+    """Raised when columns of a table cannot be converted to the declared datatypes"""
+    def __init__(self, errors: dict):
+        self.errors = errors
+        super().__init__("; ".join(f"{col}: {error}" for col, error in errors.items()))
+
+
+def invalid_values(column: pd.Series, datatype) -> pd.Series:
+    """Values of the column which cannot be parsed as the numeric or datetime datatype"""
+    datatype = str(datatype).lower()
+    if datatype.startswith(("int", "float", "uint")):
+        parsed = pd.to_numeric(column, errors="coerce")
+        invalid = parsed.isna() & column.notna()
+        if datatype.startswith(("int", "uint")):
+            # Integers cannot hold fractions
+            invalid |= parsed.notna() & (parsed % 1 != 0)
+        return column[invalid]
+    if datatype.startswith("datetime"):
+        parsed = pd.to_datetime(column, errors="coerce")
+        return column[parsed.isna() & column.notna() & (column != "")]
+    return column.iloc[0:0]
+
+
+def apply_schema(dataframe: pd.DataFrame, datatypes: dict=DATATYPES, errors: str="report") -> pd.DataFrame:
+    """
+    Convert the columns of the table to the declared datatypes
+    A column which cannot be converted is kept as it is and the error is kept per column in
+    dataframe.attrs["schema_errors"], or raised as SchemaError if errors is "raise".
+    """
+    if not errors in ("report", "raise"):
+        raise ValueError(f"Input should be one of ('report', 'raise'). Got {errors}.")
+    dataframe = dataframe.copy()
+    schema_errors = {}
+    for col, col_datatype in datatypes.items():
+        if not col in dataframe.columns:
+            continue
+        col_datatype = NULLABLE_DATATYPES.get(col_datatype, col_datatype)
+        column = dataframe[col]
+        if str(col_datatype).startswith("datetime"):
+            # Empty strings are missing dates
+            column = column.replace("", None)
+        try:
+            dataframe[col] = column.astype(col_datatype)
+        except (TypeError, ValueError) as error:
+            invalid = invalid_values(column, col_datatype)
+            if invalid.empty:
+                schema_errors[col] = f"cannot convert to {col_datatype}: {error}"
+            else:
+                examples = ", ".join(map(repr, invalid.unique()[:3]))
+                schema_errors[col] = f"{len(invalid)} values cannot be converted to {col_datatype}, e.g. {examples}"
+    if schema_errors and errors == "raise":
+        raise SchemaError(schema_errors)
+    dataframe.attrs["schema_errors"] = schema_errors
+    return dataframe
+
+
+def downcast(dataframe: pd.DataFrame, max_unique_ratio: float=0.5) -> pd.DataFrame:
+    """
+    Shrink the columns of the table beyond the declared datatypes
+    Integer columns use the smallest integer type holding their values, string columns with
+    few distinct values become categories. Floats keep their precision for the coordinates.
+    """
+    dataframe = dataframe.copy()
+    for col in dataframe.columns:
+        column = dataframe[col]
+        if pd.api.types.is_integer_dtype(column.dtype):
+            dataframe[col] = pd.to_numeric(column, downcast="integer")
+        elif (pd.api.types.is_string_dtype(column.dtype) or column.dtype == object) and len(column) > 0:
+            # Lists left in the column cannot be categories
+            if column.dtype == object and not column.map(lambda value: isinstance(value, str)).all():
+                continue
+            if column.nunique(dropna=False) / len(column) <= max_unique_ratio:
+                dataframe[col] = column.astype("category")
+    return dataframe
+
+
+def memory_report(tables: dict) -> pd.DataFrame:
+    """Takes in the tables keyed by name and returns the rows and the memory in bytes of each table"""
+    report = []
+    for name, table in tables.items():
+        report.append({
+            "table": name,
+            "rows": 0 if table is None else len(table),
+            "columns": 0 if table is None else len(table.columns),
+            "bytes": 0 if table is None else int(table.memory_usage(deep=True, index=False).sum())
+        })
+    return pd.DataFrame(report).set_index("table")
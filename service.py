@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import copy
+import json
+import math
+import time
+from urllib.parse import parse_qs, urlsplit
+from fetcher import FetchCoordinator
+from metrics import configure_logging, logger
+from poller import VacancyPoller
+from spatial import CarparkLocator
+from vehicles import CarparkScraper
+
+
+# Most car parks returned by one /nearby query
+MAX_NEARBY = 50
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+def to_json(value) -> bytes:
+    """Serialize the value as the body of a response"""
+    return json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+
+
+class SnapshotService:
+    """
+    HTTP service over the latest info and vacancy of a vehicle type, refreshed in the background
+    One upstream poll serves every client until the next poll. The responses of /vacancy and
+    /carpark/{id} are serialized once per poll, /nearby queries the spatial index. The snapshots
+    are swapped as a whole, so a request never sees half of a refresh.
+    """
+    def __init__(self, vehicle_type: str="privateCar", lang: str="zh_TW", fetcher: FetchCoordinator=None,
+                 vacancy_interval: float=60, info_interval: float=24 * 3600):
+        self.vehicle_type = vehicle_type
+        self.fetcher = FetchCoordinator() if fetcher is None else fetcher
+        self.scraper = CarparkScraper(vehicle_type=vehicle_type, lang=lang, fetcher=self.fetcher)
+        self.poller = VacancyPoller(vehicle_type, lang=lang, fetcher=self.fetcher)
+        self.vacancy_interval = vacancy_interval
+        self.info_interval = info_interval
+        self.metrics = self.fetcher.metrics
+        self.locator = None
+        self.info_parts = {}
+        self.info_updated = None
+        self.vacancy_body = None
+        self.carparks = {}
+        self.vacancy_updated = None
+
+    def refresh_info(self) -> None:
+        """Fetch the info and serialize the static part of every car park, the vacancy is joined per poll"""
+        self.scraper.get_data(data="info")
+        info_parts = {}
+        for record in self.scraper.info:
+            park_id = str(record["park_Id"])
+            carpark = {
+                "park_id": park_id,
+                "basic_info": self.scraper.get_basic_info(park_id),
+                "address": self.scraper.get_address(park_id),
+                "opening_hours": self.scraper.get_opening_hours(park_id),
+                "height_limits": self.scraper.get_height_limits(park_id),
+                "grace_periods": self.scraper.get_grace_periods(park_id),
+                "hourly_charges": self.scraper.get_charges(park_id, mode="hourlyCharges")
+            }
+            # Leave the closing brace open for the vacancy
+            info_parts[park_id] = to_json(carpark)[:-1]
+        locator = CarparkLocator.from_scraper(self.scraper)
+        if not self.poller.snapshot is None:
+            locator.update_vacancy(self.poller.snapshot)
+        self.info_parts, self.locator = info_parts, locator
+        self.info_updated = time.time()
+        self.publish()
+
+    def refresh_vacancy(self) -> None:
+        """Poll the vacancy and serialize the responses, the last good snapshot is kept if the poll fails"""
+        # A poll gives up before the next one is due
+        snapshot = self.poller.poll(deadline=min(self.poller.deadline, self.vacancy_interval))
+        if not self.locator is None:
+            # Update a copy so the queries running meanwhile see the previous vacancy
+            locator = copy.copy(self.locator)
+            locator.vacancy = locator.vacancy.copy()
+            locator.update_vacancy(snapshot)
+            self.locator = locator
+        self.vacancy_updated = snapshot.fetched_at
+        self.publish()
+
+    def publish(self) -> None:
+        """Serialize /vacancy and /carpark/{id} from the latest info and vacancy"""
+        snapshot = self.poller.snapshot
+        if snapshot is None:
+            return
+        vacancies = {park_id: to_json(snapshot.get(park_id)) for park_id in snapshot.park_ids}
+        self.vacancy_body = to_json({
+            "vehicle_type": self.vehicle_type,
+            "fetched_at": snapshot.fetched_at,
+            "results": [snapshot.get(park_id) for park_id in snapshot.park_ids]
+        })
+        self.carparks = {
+            park_id: part + b', "vacancy": ' + vacancies.get(park_id, b"null") + b"}"
+            for park_id, part in self.info_parts.items()
+        }
+
+    def nearby(self, query: dict) -> tuple:
+        """Status and body of /nearby?lat=&lon=&k=&radius=&min_vacancy="""
+        if self.locator is None:
+            return 503, to_json({"error": "The info is not loaded yet."})
+        try:
+            latitude, longitude = float(query["lat"][0]), float(query["lon"][0])
+            k = int(query.get("k", ["5"])[0])
+            min_vacancy = query.get("min_vacancy", ["1"])[0]
+            min_vacancy = None if min_vacancy == "" else int(min_vacancy)
+            radius = query.get("radius", [None])[0]
+            radius = None if radius is None else float(radius)
+        except (KeyError, ValueError):
+            return 400, to_json({"error": "Input should be lat and lon with optional k, radius and min_vacancy."})
+        # The query runs on the event loop, so its work is bounded before it reaches the locator
+        if k < 1:
+            return 400, to_json({"error": f"Input should be a k of at least 1. Got {k}."})
+        k = min(k, MAX_NEARBY)
+        if not radius is None and not (math.isfinite(radius) and radius >= 0):
+            return 400, to_json({"error": f"Input should be a radius of at least 0. Got {radius}."})
+        try:
+            if radius is None:
+                results = self.locator.nearest(latitude, longitude, k=k, min_vacancy=min_vacancy)
+            else:
+                results = self.locator.within(latitude, longitude, radius, min_vacancy=min_vacancy)[:k]
+        except ValueError as error:
+            return 400, to_json({"error": str(error)})
+        return 200, to_json({"results": results})
+
+    def route(self, method: str, target: str) -> tuple:
+        """Takes in the method and target of the request and returns the route, status, content type and body"""
+        if method != "GET":
+            return "other", 405, "application/json", to_json({"error": f"Input should be GET. Got {method}."})
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/")
+        if path == "/vacancy":
+            if self.vacancy_body is None:
+                return "vacancy", 503, "application/json", to_json({"error": "The vacancy is not loaded yet."})
+            return "vacancy", 200, "application/json", self.vacancy_body
+        if path.startswith("/carpark/"):
+            body = self.carparks.get(path[len("/carpark/"):])
+            if body is None:
+                return "carpark", 404, "application/json", to_json({"error": f"No car park {path[len('/carpark/'):]}."})
+            return "carpark", 200, "application/json", body
+        if path == "/nearby":
+            status, body = self.nearby(parse_qs(parts.query))
+            return "nearby", status, "application/json", body
+        if path == "/health":
+            now = time.time()
+            return "health", 200, "application/json", to_json({
+                "info_age": None if self.info_updated is None else now - self.info_updated,
+                "vacancy_age": None if self.vacancy_updated is None else now - self.vacancy_updated,
+                "poll_failures": self.poller.failures
+            })
+        if path == "/metrics":
+            return "metrics", 200, "text/plain; version=0.0.4", self.metrics.to_prometheus().encode("utf-8")
+        return "other", 404, "application/json", to_json({"error": f"No route {parts.path}."})
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of a keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    method, target, version = None, "", "HTTP/1.0"
+                if method is None:
+                    route, status, content_type, body = "other", 400, "application/json", to_json({"error": "Bad request line."})
+                else:
+                    route, status, content_type, body = self.route(method, target)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close" \
+                    and not method is None
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+                )
+                await writer.drain()
+                self.metrics.increment("service_requests_total", route=route, status=status)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def refresh_loop(self) -> None:
+        """Refresh the vacancy every vacancy_interval and the info every info_interval in worker threads"""
+        next_info = time.monotonic() + self.info_interval
+        while True:
+            await asyncio.sleep(self.vacancy_interval)
+            try:
+                if time.monotonic() >= next_info:
+                    next_info += self.info_interval
+                    await asyncio.to_thread(self.refresh_info)
+                await asyncio.to_thread(self.refresh_vacancy)
+            except Exception as error:
+                # Keep serving the last snapshot, the next cycle tries again
+                logger.error("Refresh of %s failed: %s", self.vehicle_type, error)
+
+    async def start(self, host: str="127.0.0.1", port: int=8080) -> asyncio.AbstractServer:
+        """Load the first snapshots, then start the server and the background refresh"""
+        await asyncio.to_thread(self.refresh_vacancy)
+        await asyncio.to_thread(self.refresh_info)
+        server = await asyncio.start_server(self.handle, host, port)
+        self.refresh_task = asyncio.create_task(self.refresh_loop())
+        logger.info("Serving %s on %s", self.vehicle_type,
+                    ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets))
+        return server
+
+    async def serve(self, host: str="127.0.0.1", port: int=8080) -> None:
+        """Run the service until it is cancelled"""
+        server = await self.start(host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.refresh_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP service over the latest car park info and vacancy")
+    parser.add_argument("--vehicle-type", default="privateCar")
+    parser.add_argument("--lang", default="zh_TW")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--interval", type=float, default=60, help="seconds between vacancy polls")
+    parser.add_argument("--base-url", default=None, help="url of the API, e.g. a local stub")
+    args = parser.parse_args()
+
+    configure_logging()
+    fetcher = FetchCoordinator() if args.base_url is None else FetchCoordinator(base_url=args.base_url)
+    service = SnapshotService(vehicle_type=args.vehicle_type, lang=args.lang, fetcher=fetcher,
+                              vacancy_interval=args.interval)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+# No two points on the earth are further apart
+MAX_DISTANCE_KM = np.pi * EARTH_RADIUS_KM
+
+
+def haversine(latitude, longitude, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great circle distance in km from a point to the arrays of points"""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+class CarparkLocator:
+    """
+    Spatial index of the car parks for nearest and radius queries joined with the latest vacancy
+    The car parks are sorted into a grid of cell_km cells once, a query only measures the
+    distance to the car parks in the cells around the point.
+    """
+    def __init__(self, park_ids, latitude, longitude, names=None, cell_km: float=1.0):
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        # Car parks without coordinates cannot be located
+        valid = ~(np.isnan(latitude) | np.isnan(longitude))
+        self.park_ids = np.asarray(park_ids, dtype=object)[valid]
+        self.names = None if names is None else np.asarray(names, dtype=object)[valid]
+        self.latitude = latitude[valid]
+        self.longitude = longitude[valid]
+        self.position = {str(park_id): row for row, park_id in enumerate(self.park_ids)}
+        self.vacancy = np.full(len(self.park_ids), -1, dtype=np.int32)
+
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        rows, cols = self.cell_of(self.latitude, self.longitude)
+        keys = self.key_of(rows, cols)
+        self.order = np.argsort(keys, kind="stable")
+        unique_keys, starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.cells = {int(key): (int(start), int(start + count)) for key, start, count in zip(unique_keys, starts, counts)}
+
+    def __len__(self) -> int:
+        return len(self.park_ids)
+
+    @classmethod
+    def from_scraper(cls, scraper, cell_km: float=1.0):
+        """Build the index from the info of the CarparkScraper, with its vacancy if it was fetched"""
+        records = scraper.info
+        park_ids = [record["park_Id"] for record in records]
+        locator = cls(
+            park_ids,
+            [record.get("latitude", np.nan) for record in records],
+            [record.get("longitude", np.nan) for record in records],
+            names=[record.get("name") for record in records],
+            cell_km=cell_km
+        )
+        if not scraper.vacancy is None:
+            locator.update_vacancy({park_id: scraper.get_vacancy(park_id) for park_id in scraper._vacancy_index})
+        return locator
+
+    def cell_of(self, latitude, longitude) -> tuple:
+        """Row and column of the grid cells of the points"""
+        return (np.floor(np.asarray(latitude) / self.cell_deg).astype(np.int64),
+                np.floor(np.asarray(longitude) / self.cell_deg).astype(np.int64))
+
+    @staticmethod
+    def key_of(rows, cols):
+        """Single integer key of the grid cells"""
+        return rows * (1 << 32) + cols
+
+    def update_vacancy(self, vacancy) -> None:
+        """
+        Join the latest vacancy to the car parks, missing vacancy is -1
+        Takes a VacancySnapshot, the vacancy table of get_table or a dict of park_id to vacancy or get_vacancy.
+        """
+        self.vacancy[:] = -1
+        if isinstance(vacancy, pd.DataFrame):
+            vacancy = dict(zip(vacancy["park_id"].astype(str), vacancy["vacancy"]))
+        elif hasattr(vacancy, "position"):
+            vacancy = dict(zip(vacancy.park_ids, vacancy.vacancy))
+        for park_id, value in vacancy.items():
+            row = self.position.get(str(park_id))
+            if isinstance(value, dict):
+                value = value.get("vacancy")
+            if row is None or value is None or pd.isna(value):
+                continue
+            self.vacancy[row] = int(value)
+
+    @staticmethod
+    def check_point(latitude: float, longitude: float) -> None:
+        """Raise a ValueError unless the point is a finite latitude and longitude"""
+        if not (np.isfinite(latitude) and -90 <= latitude <= 90):
+            raise ValueError(f"Input should be a latitude in [-90, 90]. Got {latitude}.")
+        if not (np.isfinite(longitude) and -180 <= longitude <= 180):
+            raise ValueError(f"Input should be a longitude in [-180, 180]. Got {longitude}.")
+
+    def candidates(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """Rows of the car parks in the grid cells covering the circle of radius_km around the point"""
+        # Once the radius covers the whole earth every car park is a candidate
+        if radius_km >= MAX_DISTANCE_KM:
+            return np.arange(len(self.park_ids))
+        lat_span = radius_km / KM_PER_DEGREE
+        # The cells get narrower in km towards the poles
+        lon_span = lat_span / max(np.cos(np.radians(min(abs(latitude) + lat_span, 89.9))), 1e-6)
+        row_min, col_min = self.cell_of(latitude - lat_span, longitude - lon_span)
+        row_max, col_max = self.cell_of(latitude + lat_span, longitude + lon_span)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) >= len(self.cells):
+            return np.arange(len(self.park_ids))
+        slices = []
+        for row in range(int(row_min), int(row_max) + 1):
+            for col in range(int(col_min), int(col_max) + 1):
+                cell = self.cells.get(int(self.key_of(row, col)))
+                if not cell is None:
+                    slices.append(self.order[cell[0]:cell[1]])
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def results(self, rows: np.ndarray, distances: np.ndarray) -> list:
+        """Format the car parks found by a query"""
+        return [{
+            "park_id": self.park_ids[row],
+            "name": None if self.names is None else self.names[row],
+            "latitude": float(self.latitude[row]),
+            "longitude": float(self.longitude[row]),
+            "distance_km": float(distance),
+            "vacancy": int(self.vacancy[row])
+        } for row, distance in zip(rows, distances)]
+
+    def within(self, latitude: float, longitude: float, radius_km: float, min_vacancy: int=None) -> list:
+        """Car parks within radius_km of the point ordered by distance, only with at least min_vacancy if given"""
+        self.check_point(latitude, longitude)
+        if not (np.isfinite(radius_km) and radius_km >= 0):
+            raise ValueError(f"Input should be a radius_km of at least 0. Got {radius_km}.")
+        rows = self.candidates(latitude, longitude, radius_km)
+        if not min_vacancy is None:
+            rows = rows[self.vacancy[rows] >= min_vacancy]
+        distances = haversine(latitude, longitude, self.latitude[rows], self.longitude[rows])
+        inside = distances <= radius_km
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return self.results(rows[order], distances[order])
+
+    def nearest(self, latitude: float, longitude: float, k: int=5, min_vacancy: int=None) -> list:
+        """k nearest car parks to the point, only with at least min_vacancy if given"""
+        self.check_point(latitude, longitude)
+        if k < 1:
+            raise ValueError(f"Input should be a k of at least 1. Got {k}.")
+        eligible = len(self.park_ids) if min_vacancy is None else int((self.vacancy >= min_vacancy).sum())
+        k = min(k, eligible)
+        if k == 0:
+            return []
+        radius_km = self.cell_deg * KM_PER_DEGREE
+        while True:
+            rows = self.candidates(latitude, longitude, radius_km)
+            # The radius stops doubling once it covers the whole earth and every car park is searched
+            searched_all = len(rows) == len(self.park_ids)
+            if not min_vacancy is None:
+                rows = rows[self.vacancy[rows] >= min_vacancy]
+            distances = haversine(latitude, longitude, self.latitude[rows], self.longitude[rows])
+            # All the car parks within the radius are found, so the k nearest inside it are the answer
+            if searched_all or (distances <= radius_km).sum() >= k:
+                break
+            radius_km *= 2
+        nearest = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return self.results(rows[nearest], distances[nearest])
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vacancy_history (
+    park_id TEXT NOT NULL,
+    last_update INTEGER NOT NULL,
+    vacancy_type TEXT,
+    vacancy INTEGER,
+    PRIMARY KEY (park_id, last_update)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS vacancy_history_last_update ON vacancy_history (last_update);
+CREATE TABLE IF NOT EXISTS carparks (
+    park_id TEXT PRIMARY KEY,
+    name TEXT,
+    district TEXT,
+    latitude REAL,
+    longitude REAL,
+    modified_date TEXT
+) WITHOUT ROWID;
+"""
+
+UPSERT_VACANCY = """
+INSERT INTO vacancy_history (park_id, last_update, vacancy_type, vacancy) VALUES (?, ?, ?, ?)
+ON CONFLICT (park_id, last_update) DO UPDATE SET vacancy_type = excluded.vacancy_type, vacancy = excluded.vacancy
+"""
+
+UPSERT_CARPARK = """
+INSERT INTO carparks (park_id, name, district, latitude, longitude, modified_date) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (park_id) DO UPDATE SET name = excluded.name, district = excluded.district, latitude = excluded.latitude,
+    longitude = excluded.longitude, modified_date = excluded.modified_date
+"""
+
+
+def to_epoch(last_update) -> np.ndarray:
+    """Convert the last update times to seconds since epoch, missing times become NaT"""
+    return pd.to_datetime(pd.Series(last_update), errors="coerce").to_numpy(dtype="datetime64[s]")
+
+
+class VacancyStore:
+    """
+    Append-only history of the vacancy in the sqlite database of a vehicle type
+    One connection in WAL mode is kept open, every append is one transaction of batched upserts
+    keyed by (park_id, last_update), so polling the same update twice does not add rows.
+    """
+    def __init__(self, destination: str, vehicle_type: str):
+        self.vehicle_type = vehicle_type
+        # Make the desired destination and continue if the desired destination already exists
+        os.makedirs(destination, exist_ok=True)
+        self.db_name = os.path.join(destination, f"{vehicle_type}.db")
+        self.lock = threading.Lock()
+        # Transactions are managed explicitly
+        self.conn = sqlite3.connect(self.db_name, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def executemany(self, sql: str, rows) -> None:
+        """Run the statement for all rows in one transaction"""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(sql, rows)
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def append(self, vacancy: pd.DataFrame) -> int:
+        """Append the vacancy table of CarparkScraper.get_table, returns the number of rows written"""
+        if vacancy is None or vacancy.empty:
+            return 0
+        last_update = to_epoch(vacancy["last_update"])
+        valid = ~np.isnat(last_update)
+        rows = zip(
+            vacancy["park_id"].astype(str).to_numpy()[valid].tolist(),
+            last_update[valid].astype(np.int64).tolist(),
+            vacancy["vacancy_type"].to_numpy()[valid].tolist(),
+            pd.to_numeric(vacancy["vacancy"], errors="coerce").to_numpy()[valid].tolist()
+        )
+        self.executemany(UPSERT_VACANCY, rows)
+        return int(valid.sum())
+
+    def append_snapshot(self, snapshot) -> int:
+        """Append the VacancySnapshot of VacancyPoller, returns the number of rows written"""
+        valid = ~np.isnat(snapshot.last_update)
+        rows = zip(
+            snapshot.park_ids[valid].tolist(),
+            snapshot.last_update[valid].astype(np.int64).tolist(),
+            snapshot.vacancy_type[valid].tolist(),
+            snapshot.vacancy[valid].tolist()
+        )
+        self.executemany(UPSERT_VACANCY, rows)
+        return int(valid.sum())
+
+    def save_carparks(self, basic_info: pd.DataFrame) -> None:
+        """Upsert the car parks from the basic_info table of CarparkScraper.get_table, typed or not"""
+        columns = ["park_id", "name", "district", "latitude", "longitude", "modified_date"]
+        rows = basic_info.reindex(columns=columns)
+        # sqlite cannot bind timestamps, the dates are written as text like the API
+        for col in rows.columns[rows.dtypes.map(pd.api.types.is_datetime64_any_dtype)]:
+            rows[col] = rows[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+        # Missing values are written as NULL
+        rows = rows.astype(object).where(rows.notna(), None)
+        self.executemany(UPSERT_CARPARK, rows.itertuples(index=False, name=None))
+
+    def query(self, park_id: str=None, start=None, end=None) -> pd.DataFrame:
+        """Get the vacancy history of a car park, or all car parks if None, with last_update between start and end"""
+        conditions, params = [], []
+        if not park_id is None:
+            conditions.append("park_id = ?")
+            params.append(str(park_id))
+        if not start is None:
+            conditions.append("last_update >= ?")
+            params.append(int(pd.Timestamp(start).timestamp()))
+        if not end is None:
+            conditions.append("last_update <= ?")
+            params.append(int(pd.Timestamp(end).timestamp()))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            history = pd.read_sql_query(
+                f"SELECT park_id, last_update, vacancy_type, vacancy FROM vacancy_history {where} "
+                "ORDER BY park_id, last_update", self.conn, params=params)
+        history["last_update"] = pd.to_datetime(history["last_update"], unit="s")
+        history.insert(1, "vehicle_type", self.vehicle_type)
+        return history
+
+    def latest(self) -> pd.DataFrame:
+        """Get the latest vacancy of every car park"""
+        with self.lock:
+            latest = pd.read_sql_query(
+                "SELECT park_id, MAX(last_update) AS last_update, vacancy_type, vacancy FROM vacancy_history "
+                "GROUP BY park_id ORDER BY park_id", self.conn)
+        latest["last_update"] = pd.to_datetime(latest["last_update"], unit="s")
+        latest.insert(1, "vehicle_type", self.vehicle_type)
+        return latest
+
+    def close(self) -> None:
+        """Close the connection"""
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+WEEKDAYS = ("MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN", "PH")
+
+
+def generate_payload(n: int, vehicle_type: str="privateCar", seed: int=0) -> tuple:
+    """Generate the info and vacancy payload of n synthetic car parks in the format of the API"""
+    rng = random.Random(seed)
+    info, vacancy = [], []
+    for i in range(n):
+        park_id = str(i + 1)
+        carpark = {
+            "park_Id": park_id,
+            "name": f"Carpark {park_id}",
+            "nature": rng.choice(("government", "commercial")),
+            "carpark_Type": rng.choice(("multi-storey", "off-street", "metered")),
+            "displayAddress": f"{i} Queen's Road Central, Hong Kong",
+            "district": rng.choice(("Central & Western", "Wan Chai", "Yau Tsim Mong", "Sha Tin")),
+            "latitude": round(22.2 + rng.random() * 0.3, 6),
+            "longitude": round(113.9 + rng.random() * 0.4, 6),
+            "contactNo": f"2{rng.randint(1000000, 9999999)}",
+            "opening_status": rng.choice(("OPEN", "CLOSED")),
+            "facilities": rng.sample(("disabilities", "evCharger", "washing", "unloading"), 2),
+            "paymentMethods": rng.sample(("octopus", "visa", "master", "cash"), 2),
+            "creationDate": "2015-01-01 00:00:00",
+            "modifiedDate": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 00:00:00",
+            "publishedDate": "2015-01-01 00:00:00",
+            "website": f"https://example.com/carpark/{park_id}",
+            "lang": "en_US"
+        }
+        if rng.random() < 0.9:
+            carpark["address"] = {
+                "buildingName": f"Building {i}",
+                "streetName": "Queen's Road Central",
+                "buildingNo": str(rng.randint(1, 300)),
+                "floor": rng.choice(("G/F", "1/F", "B1")),
+                "subDistrict": "Central",
+                "dcDistrict": "Central & Western District",
+                "region": rng.choice(("HK", "KLN", "NT"))
+            }
+        if rng.random() < 0.8:
+            carpark["renditionUrls"] = {
+                "square": f"https://example.com/{park_id}/square.jpg",
+                "thumbnail": f"https://example.com/{park_id}/thumbnail.jpg",
+                "banner": f"https://example.com/{park_id}/banner.jpg"
+            }
+        if rng.random() < 0.7:
+            carpark["gracePeriods"] = [{"minutes": rng.choice((10, 15, 30))}]
+        if rng.random() < 0.6:
+            carpark["heightLimits"] = [{"height": rng.choice((1.9, 2.0, 2.1))}, {"height": 4.0, "remark": "Ground floor"}]
+        if rng.random() < 0.9:
+            carpark["openingHours"] = [
+                {"weekdays": list(WEEKDAYS[:5]), "excludePublicHoliday": True, "periodStart": "07:00", "periodEnd": "24:00"},
+                {"weekdays": list(WEEKDAYS[5:]), "excludePublicHoliday": False, "periodStart": "00:00", "periodEnd": "24:00"}
+            ]
+        if rng.random() < 0.95:
+            charges = {
+                "space": rng.randint(10, 800),
+                "spaceDIS": rng.randint(0, 5),
+                "spaceEV": rng.randint(0, 20),
+                "spaceUNL": 0,
+                "hourlyCharges": [
+                    {"type": "hourly", "weekdays": list(WEEKDAYS[:5]), "excludePublicHoliday": True,
+                     "periodStart": "07:00", "periodEnd": "19:00", "price": rng.choice((15, 20, 28)),
+                     "usageThresholds": [{"hours": 3, "price": 60}], "covered": "covered"},
+                    {"type": "hourly", "weekdays": list(WEEKDAYS), "excludePublicHoliday": False,
+                     "periodStart": "19:00", "periodEnd": "07:00", "price": rng.choice((10, 12)),
+                     "covered": "covered", "remark": "Overnight"}
+                ]
+            }
+            if rng.random() < 0.5:
+                charges["monthlyCharges"] = [{"type": "monthly", "price": rng.choice((2500, 3200)), "ranges": [],
+                                              "covered": "covered", "reserved": "non-reserved"}]
+            if rng.random() < 0.3:
+                charges["dayNightParks"] = [{"type": "day-park", "weekdays": list(WEEKDAYS[:5]),
+                                             "excludePublicHoliday": True, "periodStart": "08:00",
+                                             "periodEnd": "18:00", "validUntil": "sameDay",
+                                             "validUntilEnd": "24:00", "price": 120, "covered": "covered"}]
+            if rng.random() < 0.3:
+                charges["privileges"] = [{"excludePublicHoliday": False, "periodStart": "08:00",
+                                          "periodEnd": "18:00", "description": "Free parking for shoppers"}]
+            if rng.random() < 0.3:
+                charges["unloadings"] = [{"type": "unloading", "price": 5, "usageThresholds": [{"hours": 1}]}]
+            carpark[vehicle_type] = charges
+        info.append(carpark)
+
+        vacancy_record = {"park_Id": park_id}
+        if rng.random() < 0.9:
+            vacancy_record[vehicle_type] = [{
+                "vacancy_type": "A",
+                "vacancy": rng.randint(-1, 200),
+                "lastupdate": f"2025-01-01 12:{rng.randint(0, 59):02d}:00"
+            }]
+        vacancy.append(vacancy_record)
+    return {"results": info}, {"results": vacancy}
+
+
+def localize_payload(records: list, lang: str) -> list:
+    """Copy the info records with the localized fields of the payload tagged with the language"""
+    records = json.loads(json.dumps(records))
+    localized_fields = ("name", "displayAddress", "district", "buildingName", "streetName", "subDistrict",
+                        "dcDistrict", "floor", "remark", "description")
+
+    def tag(value):
+        if isinstance(value, dict):
+            return {key: f"{item} [{lang}]" if key in localized_fields and isinstance(item, str) else tag(item)
+                    for key, item in value.items()}
+        if isinstance(value, list):
+            return [tag(item) for item in value]
+        return value
+    return [tag(record) for record in records]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve the payload of the server in the format of the API"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if not self.server.keep_alive:
+            # Answer like a plain HTTP/1.0 server which closes the connection after each response
+            self.protocol_version = "HTTP/1.0"
+            self.close_connection = True
+        query = parse_qs(urlparse(self.path).query)
+        body = self.server.body(query["data"][0], query["vehicleTypes"][0], lang=query.get("lang", ["en_US"])[0],
+                                carpark_ids=query.get("carparkIds", [None])[0], extent=query.get("extent", [None])[0])
+        self.server.requests += 1
+        # Inject the latency of the upstream API
+        time.sleep(self.server.latency)
+        fault = self.server.next_fault()
+        if fault == "error":
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if fault == "slow":
+            time.sleep(self.server.slow_seconds)
+        elif fault == "drop":
+            # Close the connection without a response
+            self.close_connection = True
+            return
+        elif fault == "trickle":
+            # Every piece comes within the socket timeout, the whole body takes slow_seconds
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            step = len(body) // 10 + 1
+            for start in range(0, len(body), step):
+                time.sleep(self.server.slow_seconds / 10)
+                self.wfile.write(body[start:start + step])
+                self.wfile.flush()
+            return
+        elif fault == "truncate":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local server standing in for the carpark-info-vacancy API
+    inject queues faults for the next requests: "error" answers 503, "slow" waits slow_seconds,
+    "drop" closes the connection without a response, "truncate" sends half of the body and "trickle"
+    sends the body in ten pieces over slow_seconds. Without keep_alive every response is HTTP/1.0
+    and closes its connection.
+    """
+    daemon_threads = True
+
+    def __init__(self, n: int=1000, vehicle_types=("privateCar",), latency: float=0, slow_seconds: float=2,
+                 keep_alive: bool=True):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.keep_alive = keep_alive
+        self.slow_seconds = slow_seconds
+        self.faults = []
+        self.fault_lock = threading.Lock()
+        self.requests = 0
+        self.payloads = {}
+        self.records = {}
+        self.localized = {}
+        for vehicle_type in vehicle_types:
+            info, vacancy = generate_payload(n, vehicle_type=vehicle_type)
+            self.records[("info", vehicle_type)] = info["results"]
+            self.records[("vacancy", vehicle_type)] = vacancy["results"]
+            self.payloads[("info", vehicle_type)] = json.dumps(info).encode("utf-8")
+            self.payloads[("vacancy", vehicle_type)] = json.dumps(vacancy).encode("utf-8")
+        self.locations = {record["park_Id"]: (record["longitude"], record["latitude"]) for record in info["results"]}
+        self.url = f"http://127.0.0.1:{self.server_port}/v1/carpark-info-vacancy"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def handle_error(self, request, client_address):
+        # Clients which timed out close the connection before the slow response is written
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def body(self, data: str, vehicle_type: str, lang: str="en_US", carpark_ids: str=None, extent: str=None) -> bytes:
+        """Response body of the query in the language, filtered by carparkIds and extent like the API"""
+        if data == "info" and lang != "en_US":
+            with self.fault_lock:
+                if not (vehicle_type, lang) in self.localized:
+                    records = localize_payload(self.records[(data, vehicle_type)], lang)
+                    self.localized[(vehicle_type, lang)] = (records, json.dumps({"results": records}).encode("utf-8"))
+            records, payload = self.localized[(vehicle_type, lang)]
+        else:
+            records, payload = self.records[(data, vehicle_type)], self.payloads[(data, vehicle_type)]
+        if carpark_ids is None and extent is None:
+            return payload
+        results = records
+        if not carpark_ids is None:
+            ids = set(carpark_ids.split(","))
+            results = [record for record in results if record["park_Id"] in ids]
+        if not extent is None:
+            min_x, min_y, max_x, max_y = map(float, extent.split(","))
+            results = [record for record in results
+                       if min_x <= self.locations[record["park_Id"]][0] <= max_x
+                       and min_y <= self.locations[record["park_Id"]][1] <= max_y]
+        return json.dumps({"results": results}).encode("utf-8")
+
+    def inject(self, *faults) -> None:
+        """Queue the faults for the next requests, None lets a request through"""
+        with self.fault_lock:
+            self.faults.extend(faults)
+
+    def next_fault(self) -> str:
+        with self.fault_lock:
+            return self.faults.pop(0) if self.faults else None
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from public_holidays import HolidayCalendar
+
+
+WEEKDAYS = ("MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN", "PH")
+MINUTES_PER_DAY = 24 * 60
+# Minutes paid for by the price of each type of hourly charge
+BILLING_UNITS = {"hourly": 60, "half-hourly": 30}
+BILLING_STEP = min(BILLING_UNITS.values())
+
+
+def to_minutes(time: str) -> float:
+    """Convert the time of the API like "07:30" to minutes since midnight, NaN if missing"""
+    if not isinstance(time, str) or not ":" in time:
+        return np.nan
+    hours, minutes = time.split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def weekday_mask(weekdays) -> int:
+    """Bitmask of the weekdays, bit 0 is MON and bit 7 is PH. Takes the list of the API or its string"""
+    if weekdays is None:
+        return 0
+    return sum(1 << bit for bit, day in enumerate(WEEKDAYS) if day in weekdays)
+
+
+class IntervalTable:
+    """
+    Periods of the opening hours or the charges of all car parks compiled into arrays
+    Each period is an interval of minutes of the day with the bitmask of its weekdays. A period
+    past midnight like 19:00 to 07:00 is split in two, the second part has offset 1 and applies
+    the day after the weekday it starts on.
+    """
+    def __init__(self, periods: list):
+        rows, masks, excludes, starts, ends, offsets, values, units = [], [], [], [], [], [], [], []
+
+        def add(row, mask, exclude, start, end, offset, value, unit):
+            rows.append(row)
+            masks.append(mask)
+            excludes.append(exclude)
+            starts.append(start)
+            ends.append(end)
+            offsets.append(offset)
+            values.append(value)
+            units.append(unit)
+
+        for row, weekdays, exclude, period_start, period_end, value, unit in periods:
+            start, end = to_minutes(period_start), to_minutes(period_end)
+            if np.isnan(start) or np.isnan(end):
+                continue
+            mask = weekday_mask(weekdays)
+            exclude = bool(exclude)
+            if end <= start:
+                # 00:00 to 00:00 is the whole day, others continue on the next day
+                add(row, mask, exclude, start, MINUTES_PER_DAY, 0, value, unit)
+                if end > 0:
+                    add(row, mask, exclude, 0, end, 1, value, unit)
+            else:
+                add(row, mask, exclude, start, end, 0, value, unit)
+
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.masks = np.asarray(masks, dtype=np.int64)
+        self.excludes = np.asarray(excludes, dtype=bool)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.units = np.asarray(units, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def active(self, when: pd.Timestamp, is_holiday) -> np.ndarray:
+        """Mask of the periods covering the time, is_holiday tells if a date is a public holiday"""
+        minute = when.hour * 60 + when.minute
+        today, yesterday = when.normalize(), when.normalize() - pd.Timedelta(days=1)
+        weekday = np.where(self.offsets == 0, today.weekday(), yesterday.weekday())
+        holiday = np.where(self.offsets == 0, is_holiday(today), is_holiday(yesterday))
+        # A period applies on its weekdays unless it excludes public holidays, and on public holidays if PH is listed
+        applies = (((self.masks >> weekday) & 1).astype(bool) & ~(holiday & self.excludes)) | \
+            (holiday & ((self.masks >> WEEKDAYS.index("PH")) & 1).astype(bool))
+        return applies & (self.starts <= minute) & (minute < self.ends)
+
+
+class TariffEvaluator:
+    """
+    Answer "is it open" and "what does it cost" for all car parks of a vehicle type at once
+    The opening hours and the hourly charges are compiled once from the info records, a query
+    is a few array operations over all periods instead of string comparisons per row.
+    """
+    def __init__(self, records: list, vehicle_type: str, holidays=None):
+        """
+        holidays takes a HolidayCalendar, or the dates of the public holidays
+        The public holidays of gov.hk are loaded by year on use if None, pass () for none at all.
+        """
+        self.vehicle_type = vehicle_type
+        self.park_ids = np.asarray([str(record["park_Id"]) for record in records], dtype=object)
+        if holidays is None:
+            self.calendar = HolidayCalendar()
+        else:
+            self.calendar = holidays if isinstance(holidays, HolidayCalendar) else HolidayCalendar(dates=holidays)
+        # Car parks marked as closed are never open
+        self.closed = np.asarray([record.get("opening_status") == "CLOSED" for record in records], dtype=bool)
+
+        opening_hours, charges = [], []
+        for row, record in enumerate(records):
+            for hour in record.get("openingHours") or []:
+                opening_hours.append((row, hour.get("weekdays"), hour.get("excludePublicHoliday"),
+                                      hour.get("periodStart"), hour.get("periodEnd"), np.nan, 0))
+            for charge in (record.get(vehicle_type) or {}).get("hourlyCharges") or []:
+                if charge.get("price") is None:
+                    continue
+                charges.append((row, charge.get("weekdays"), charge.get("excludePublicHoliday"),
+                                charge.get("periodStart"), charge.get("periodEnd"), charge.get("price"),
+                                BILLING_UNITS.get(charge.get("type"), 60)))
+        self.opening_hours = IntervalTable(opening_hours)
+        self.charges = IntervalTable(charges)
+        self.has_opening_hours = np.bincount(self.opening_hours.rows, minlength=len(self.park_ids)) > 0
+        self.has_charges = np.bincount(self.charges.rows, minlength=len(self.park_ids)) > 0
+
+    def __len__(self) -> int:
+        return len(self.park_ids)
+
+    @classmethod
+    def from_scraper(cls, scraper, holidays=None):
+        """Compile the opening hours and the hourly charges from the info of the CarparkScraper"""
+        return cls(scraper.info, scraper.vehicle_type, holidays=holidays)
+
+    def is_open(self, when=None) -> pd.Series:
+        """Takes in the time, now if None, and returns if each car park is open. Missing if it has no opening hours"""
+        when = pd.Timestamp.now() if when is None else pd.Timestamp(when)
+        active = self.opening_hours.active(when, self.calendar.is_holiday)
+        is_open = np.bincount(self.opening_hours.rows[active], minlength=len(self.park_ids)) > 0
+        is_open &= ~self.closed
+        return pd.Series(pd.array(is_open, dtype="boolean"), index=pd.Index(self.park_ids, name="park_id"),
+                         name="is_open").mask(~self.has_opening_hours)
+
+    def price(self, start, end) -> pd.Series:
+        """
+        Takes in the start and the end of a stay and returns its price at each car park
+        Every started billing unit is paid at the price of the period it starts in. Hourly and half-hourly
+        charges are totalled separately and the cheaper total applies. The price is missing if some
+        part of the stay is not covered by the charges of any unit. Usage thresholds are not applied.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        if end < start:
+            raise ValueError(f"The end of the stay should not be before its start. Got {start} to {end}.")
+        # The stay is priced with the charges of each billing unit on their own, the cheapest unit applies
+        units = np.unique(self.charges.units)
+        totals = np.zeros((len(units), len(self.park_ids)), dtype=np.float64)
+        steps = int(np.ceil((end - start) / pd.Timedelta(minutes=BILLING_STEP)))
+        for step in range(steps):
+            when = start + pd.Timedelta(minutes=step * BILLING_STEP)
+            active = self.charges.active(when, self.calendar.is_holiday)
+            for group, unit in enumerate(units):
+                # A unit of 60 minutes only starts every other step
+                if (step * BILLING_STEP) % unit != 0:
+                    continue
+                due = active & (self.charges.units == unit)
+                unit_price = np.full(len(self.park_ids), np.inf)
+                # The cheapest of overlapping charges applies
+                np.minimum.at(unit_price, self.charges.rows[due], self.charges.values[due])
+                totals[group] += unit_price
+        total = totals.min(axis=0) if len(units) else np.full(len(self.park_ids), np.inf)
+        total[np.isinf(total) | ~self.has_charges] = np.nan
+        return pd.Series(total, index=pd.Index(self.park_ids, name="park_id"), name="price")
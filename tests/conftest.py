@@ -0,0 +1,15 @@
+import os
+import sys
+import pytest
+
+# The modules sit at the top of the repository, next to the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_api import StubServer
+
+
+@pytest.fixture
+def server():
+    """Local stub of the API with 100 car parks, faults injected by a test do not leak into the next one"""
+    with StubServer(100, vehicle_types=("privateCar", "LGV"), slow_seconds=1) as server:
+        yield server
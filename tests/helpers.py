@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from fetcher import FetchCoordinator
+from normalize import TableNormalizer, normalize_vacancy
+from stub_api import StubServer
+from vehicles import CarparkScraper
+
+
+def per_id_table(scraper: CarparkScraper, info: str) -> pd.DataFrame:
+    """Build the table by calling the accessors once per car park"""
+    accessors = {
+        "address": scraper.get_address,
+        "basic_info": scraper.get_basic_info,
+        "height_limits": scraper.get_height_limits,
+        "opening_hours": scraper.get_opening_hours,
+        "grace_periods": scraper.get_grace_periods,
+        "vacancy": scraper.get_vacancy
+    }
+    info_list = []
+    for id in scraper.park_ids:
+        if info == "charges":
+            element = []
+            for park_mode in ("privileges", "monthlyCharges", "hourlyCharges", "dayNightParks", "unloadings"):
+                element.extend(scraper.get_charges(park_id=id, mode=park_mode))
+        else:
+            element = accessors[info](park_id=id)
+        if isinstance(element, list):
+            info_list.extend(element)
+        elif isinstance(element, dict):
+            info_list.append(element)
+    return pd.DataFrame(info_list).fillna(np.nan)
+
+
+def make_scraper(n: int, vehicle_type: str="privateCar") -> CarparkScraper:
+    """Make a scraper holding the info and vacancy of n synthetic car parks"""
+    with StubServer(n, vehicle_types=(vehicle_type,)) as server:
+        scraper = CarparkScraper(vehicle_type=vehicle_type, fetcher=FetchCoordinator(base_url=server.url))
+        scraper.get_data(data="info")
+        scraper.get_data(data="vacancy")
+    return scraper
+
+
+def normalized_table(scraper: CarparkScraper, info: str) -> pd.DataFrame:
+    """Build the table with the normalizer used by get_table, before its datatype conversion"""
+    if info == "vacancy":
+        vacancies = [scraper._vacancy_index[str(id)] for id in scraper.park_ids]
+        table = normalize_vacancy(scraper.park_ids, vacancies, scraper.vehicle_type)
+    else:
+        records = [scraper.get_carpark(id) for id in scraper.park_ids]
+        table = TableNormalizer(records, scraper.vehicle_type, park_ids=scraper.park_ids).table(info)
+    return table.fillna(np.nan)
@@ -0,0 +1,41 @@
+import json
+from cache import ResponseCache
+from fetcher import FetchCoordinator
+
+PARAMS = {"data": "vacancy", "vehicleTypes": "privateCar", "lang": "zh_TW"}
+
+
+def test_fresh_entry_is_served_without_request(server, tmp_path):
+    fetcher = FetchCoordinator(base_url=server.url, cache=ResponseCache(str(tmp_path), ttl=3600))
+    cold = fetcher.get(PARAMS)
+    assert not "X-Cache" in cold.headers
+    requests = server.requests
+    hit = fetcher.get(PARAMS)
+    assert hit.headers["X-Cache"] == "hit"
+    assert hit.body == cold.body
+    assert server.requests == requests
+
+
+def test_stale_entry_is_revalidated_with_304(server, tmp_path):
+    fetcher = FetchCoordinator(base_url=server.url, cache=ResponseCache(str(tmp_path), ttl=0))
+    cold = fetcher.get(PARAMS)
+    requests = server.requests
+    revalidated = fetcher.get(PARAMS)
+    assert revalidated.headers["X-Cache"] == "revalidated"
+    assert revalidated.body == cold.body
+    assert server.requests == requests + 1
+    assert fetcher.metrics.to_dict()["http_requests_total"][
+        (("data", "vacancy"), ("lang", "zh_TW"), ("status", "304"), ("vehicle_type", "privateCar"))] >= 1
+
+
+def test_changed_response_replaces_entry(server, tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=0)
+    fetcher = FetchCoordinator(base_url=server.url, cache=cache)
+    fetcher.get(PARAMS)
+    changed = json.dumps({"results": server.records[("vacancy", "privateCar")][:10]}).encode("utf-8")
+    server.payloads[("vacancy", "privateCar")] = changed
+    response = fetcher.get(PARAMS)
+    assert not "X-Cache" in response.headers
+    assert response.body == changed
+    assert cache.get(PARAMS).body == changed
+    assert len(fetcher.fetch(data="vacancy", vehicle_type="privateCar")) == 10
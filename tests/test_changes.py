@@ -0,0 +1,62 @@
+import pandas as pd
+from changes import ChangeDetector, diff_tables
+
+
+def make_table(rows: list) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["park_id", "vacancy", "last_update"])
+
+
+PREVIOUS = make_table([
+    ("1", 10, "2025-01-01 12:00:00"),
+    ("2", 20, "2025-01-01 12:00:00"),
+    ("2", 5, "2025-01-01 12:00:00"),
+    ("3", 30, "2025-01-01 12:00:00")
+])
+
+
+def test_diff_inserted_updated_removed():
+    current = make_table([
+        ("1", 10, "2025-01-01 12:00:00"),
+        ("2", 21, "2025-01-01 12:00:00"),
+        ("2", 5, "2025-01-01 12:00:00"),
+        ("4", 40, "2025-01-01 12:00:00")
+    ])
+    changes = diff_tables(PREVIOUS, current)
+    assert changes.inserted["park_id"].tolist() == ["4"]
+    # All the current rows of an updated car park, not only the changed row
+    assert changes.updated["vacancy"].tolist() == [21, 5]
+    assert changes.removed["park_id"].tolist() == ["3"]
+    assert sorted(changes.park_ids) == ["2", "3", "4"]
+    assert len(changes.upserts) == 3
+
+
+def test_diff_version_columns_ignore_other_columns():
+    # The vacancy changed without a new last_update, and the other way round
+    current = PREVIOUS.copy()
+    current.loc[0, "vacancy"] = 11
+    current.loc[3, "last_update"] = "2025-01-01 12:05:00"
+    assert diff_tables(PREVIOUS, current).updated["park_id"].unique().tolist() == ["1", "3"]
+    assert diff_tables(PREVIOUS, current, columns=["last_update"]).updated["park_id"].tolist() == ["3"]
+
+
+def test_diff_row_order():
+    # The order of the car parks does not count, the order of the rows of a car park does
+    assert not diff_tables(PREVIOUS, PREVIOUS.iloc[[3, 1, 2, 0]])
+    assert diff_tables(PREVIOUS, PREVIOUS.iloc[[0, 2, 1, 3]]).updated["park_id"].unique().tolist() == ["2"]
+
+
+def test_diff_from_nothing():
+    changes = diff_tables(None, PREVIOUS)
+    assert len(changes.inserted) == len(PREVIOUS)
+    assert changes.updated.empty and changes.removed.empty
+
+
+def test_detector_commits_separately():
+    detector = ChangeDetector()
+    assert detector.diff("vacancy", PREVIOUS, target="a")
+    # Not committed, the same changes come again
+    assert len(detector.diff("vacancy", PREVIOUS, target="a").inserted) == len(PREVIOUS)
+    detector.commit("vacancy", PREVIOUS, target="a")
+    assert not detector.diff("vacancy", PREVIOUS, target="a")
+    assert detector.update("vacancy", PREVIOUS, target="b")
+    assert not detector.update("vacancy", PREVIOUS, target="b")
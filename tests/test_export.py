@@ -0,0 +1,109 @@
+import filecmp
+import sqlite3
+import pandas as pd
+import pytest
+from cache import ResponseCache
+from export import export_all, export_vehicle_type
+from fetcher import FetchCoordinator
+from store import VacancyStore
+from vehicles import TABLES, CarparkScraper
+
+
+@pytest.fixture
+def scraper(server):
+    scraper = CarparkScraper(vehicle_type="privateCar", fetcher=FetchCoordinator(base_url=server.url))
+    scraper.get_data(data="info")
+    scraper.get_data(data="vacancy")
+    return scraper
+
+
+def test_appended_vacancy_snapshots_share_schema(scraper, tmp_path):
+    vacancy = scraper.get_table("vacancy")
+    # Downcast, the first snapshot would be Int8 and the second Int16
+    scraper.save_parquet(str(tmp_path), "vacancy", table=scraper.get_table("vacancy", compact=True).assign(
+        vacancy=lambda table: (table["vacancy"] % 100).astype("Int8")))
+    scraper.save_parquet(str(tmp_path), "vacancy", table=vacancy.assign(vacancy=200))
+    dataset = pd.read_parquet(tmp_path / "vacancy")
+    assert len(dataset) == 2 * len(vacancy)
+    assert str(dataset["vacancy"].dtype) == "Int16"
+
+
+def test_typed_basic_info_is_saved_to_store(scraper, tmp_path):
+    with VacancyStore(str(tmp_path), "privateCar") as store:
+        store.save_carparks(scraper.get_table("basic_info"))
+        store.save_carparks(scraper.get_table("basic_info", compact=True))
+        modified_dates = [row[0] for row in store.conn.execute("SELECT modified_date FROM carparks")]
+    assert len(modified_dates) == 100
+    assert all(len(date) == len("2025-01-01 00:00:00") for date in modified_dates)
+
+
+def test_sqlite_reads_back_the_source_values(scraper, server, tmp_path):
+    for info in ("basic_info", "height_limits"):
+        scraper.save_sqlite(str(tmp_path), info)
+    with sqlite3.connect(tmp_path / "privateCar.db") as conn:
+        dates = dict(conn.execute("SELECT park_id, modified_date FROM basic_info"))
+        heights = {row[0] for row in conn.execute("SELECT height FROM height_limits")}
+    assert dates == {record["park_Id"]: record["modifiedDate"] for record in server.records[("info", "privateCar")]}
+    assert heights == {1.9, 2.0, 2.1, 4.0}
+
+
+def test_incremental_sqlite_removes_deleted_carpark(scraper, tmp_path):
+    table = scraper.get_table("basic_info")
+    scraper.save_sqlite(str(tmp_path), "basic_info", incremental=True, table=table)
+    removed = table["park_id"].iloc[0]
+    scraper.save_sqlite(str(tmp_path), "basic_info", incremental=True, table=table.iloc[1:])
+    with sqlite3.connect(tmp_path / "privateCar.db") as conn:
+        park_ids = [row[0] for row in conn.execute("SELECT park_id FROM basic_info")]
+    assert len(park_ids) == len(table) - 1
+    assert not removed in park_ids
+
+
+def test_failed_incremental_write_is_retried(scraper, tmp_path):
+    table = scraper.get_table("basic_info")
+    # The database cannot be opened while a directory takes its name
+    (tmp_path / "privateCar.db").mkdir()
+    with pytest.raises(sqlite3.OperationalError):
+        scraper.save_sqlite(str(tmp_path), "basic_info", incremental=True, table=table)
+    (tmp_path / "privateCar.db").rmdir()
+    scraper.save_sqlite(str(tmp_path), "basic_info", incremental=True, table=table)
+    with sqlite3.connect(tmp_path / "privateCar.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM basic_info").fetchone()[0] == len(table)
+
+
+def test_streamed_csv_matches_save_csv(scraper, tmp_path):
+    for info in TABLES:
+        scraper.save_csv(str(tmp_path / "tables"), info)
+    scraper.save_csv_stream(str(tmp_path / "stream"), chunk_size=30)
+    for info in TABLES:
+        assert filecmp.cmp(tmp_path / "tables" / f"{info}.csv", tmp_path / "stream" / f"{info}.csv", shallow=False), info
+
+
+def test_export_paths_write_identical_files(server, tmp_path):
+    vehicle_types = ("privateCar", "LGV")
+    for vehicle_type in vehicle_types:
+        scraper = CarparkScraper(vehicle_type=vehicle_type, fetcher=FetchCoordinator(base_url=server.url))
+        scraper.get_data(data="info")
+        scraper.get_data(data="vacancy")
+        for info in TABLES:
+            scraper.save_csv(str(tmp_path / "separate" / vehicle_type), info)
+        scraper.save_all(str(tmp_path / "one_pass" / vehicle_type))
+    rows = export_all(str(tmp_path / "processes"), vehicle_types=vehicle_types, processes=2, base_url=server.url)
+    assert list(rows.index) == list(vehicle_types)
+    assert (rows["basic_info"] == 100).all()
+    for vehicle_type in vehicle_types:
+        for info in TABLES:
+            files = [tmp_path / method / vehicle_type / f"{info}.csv" for method in ("separate", "one_pass", "processes")]
+            contents = [file.read_bytes() if file.exists() else None for file in files]
+            assert contents[0] == contents[1] == contents[2], (vehicle_type, info)
+
+
+def test_export_vehicle_type_reads_the_cache(server, tmp_path):
+    # The responses are in the cache, the worker does not ask the API again
+    fetcher = FetchCoordinator(base_url=server.url, cache=ResponseCache(str(tmp_path / "cache")))
+    fetcher.prefetch(vehicle_types=("LGV",), langs=("zh_TW",))
+    requests = server.requests
+    rows = export_vehicle_type("LGV", str(tmp_path / "LGV"), infos=("basic_info", "vacancy"), formats=("csv", "sqlite"),
+                               cache_directory=str(tmp_path / "cache"), base_url=server.url)
+    assert server.requests == requests
+    assert rows["basic_info"] == 100
+    assert (tmp_path / "LGV" / "vacancy.csv").exists() and (tmp_path / "LGV" / "LGV.db").exists()
@@ -0,0 +1,77 @@
+import time
+from urllib.error import URLError
+import pytest
+import vehicles
+from fetcher import CircuitBreaker, CircuitOpenError, FetchCoordinator, RetryPolicy
+from poller import VacancyPoller
+
+
+def make_fetcher(server, **kwargs) -> FetchCoordinator:
+    return FetchCoordinator(base_url=server.url, timeout=0.5, retry=RetryPolicy(retries=3, backoff=0.01), **kwargs)
+
+
+@pytest.mark.parametrize("fault", ["error", "slow", "drop", "truncate"])
+def test_retries_recover_from_fault(server, fault):
+    fetcher = make_fetcher(server)
+    server.inject(fault, fault)
+    requests = server.requests
+    assert len(fetcher.fetch(data="vacancy", vehicle_type="privateCar")) == 100
+    assert server.requests == requests + 3
+
+
+def test_breaker_fails_fast_and_closes_after_trial(server):
+    fetcher = make_fetcher(server, breaker=CircuitBreaker(failure_threshold=4, reset_timeout=0.3))
+    server.inject(*["error"] * 4)
+    with pytest.raises(URLError):
+        fetcher.fetch(data="vacancy", vehicle_type="privateCar")
+    assert fetcher.breaker.state == "open"
+    requests = server.requests
+    with pytest.raises(CircuitOpenError):
+        fetcher.fetch(data="vacancy", vehicle_type="privateCar")
+    assert server.requests == requests
+    time.sleep(0.3)
+    assert len(fetcher.fetch(data="vacancy", vehicle_type="privateCar")) == 100
+    assert fetcher.breaker.state == "closed"
+
+
+def test_deadline_stops_retries(server):
+    fetcher = FetchCoordinator(base_url=server.url, retry=RetryPolicy(retries=10, backoff=0.2, deadline=0.3))
+    server.inject(*["error"] * 10)
+    start = time.monotonic()
+    with pytest.raises(URLError):
+        fetcher.fetch(data="vacancy", vehicle_type="privateCar")
+    assert time.monotonic() - start < 0.5
+
+
+def test_poller_keeps_last_good_snapshot(server):
+    poller = VacancyPoller("privateCar", fetcher=make_fetcher(server, breaker=CircuitBreaker(failure_threshold=100)))
+    good = poller.poll()
+    server.inject(*["slow"] * 4)
+    assert poller.poll() is good
+    assert poller.failures == 1
+    assert not poller.poll() is good
+    assert poller.failures == 0
+
+
+def test_poll_stops_at_deadline_of_trickling_response(server):
+    # Each piece of the body comes within the socket timeout, only the deadline stops the poll
+    poller = VacancyPoller("privateCar", fetcher=make_fetcher(server), deadline=0.4)
+    good = poller.poll()
+    server.inject("trickle")
+    start = time.monotonic()
+    assert poller.poll() is good
+    assert time.monotonic() - start < 0.6
+
+
+def test_get_data_keeps_last_good_vacancy(server):
+    scraper = vehicles.CarparkScraper(vehicle_type="privateCar", fetcher=make_fetcher(server))
+    vacancy = scraper.get_data(data="vacancy")
+    server.inject(*["error"] * 4)
+    assert scraper.get_data(data="vacancy") is vacancy
+
+
+def test_get_data_raises_without_last_good(server):
+    scraper = vehicles.CarparkScraper(vehicle_type="privateCar", fetcher=make_fetcher(server))
+    server.inject(*["error"] * 4)
+    with pytest.raises(URLError):
+        scraper.get_data(data="vacancy")
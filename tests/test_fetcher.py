@@ -0,0 +1,65 @@
+from fetcher import FetchCoordinator
+from poller import VacancyPoller
+from stub_api import StubServer
+from vehicles import TABLES, CarparkScraper
+
+
+def test_fetch_all_matches_fetch(server):
+    fetcher = FetchCoordinator(base_url=server.url, max_connections=3)
+    results = fetcher.fetch_all(data=("info", "vacancy"), vehicle_types=("privateCar", "LGV"), langs=("zh_TW", "en_US"))
+    assert len(results) == 8
+    for (data, vehicle_type, lang), records in results.items():
+        assert records == fetcher.fetch(data=data, vehicle_type=vehicle_type, lang=lang)
+
+
+def test_pool_reuses_connections(server):
+    fetcher = FetchCoordinator(base_url=server.url, max_connections=2)
+    fetcher.fetch_all(data=("vacancy",), vehicle_types=("privateCar", "LGV"), langs=("zh_TW", "en_US", "zh_CN"))
+    # Six requests over at most two keep-alive connections
+    assert 0 < fetcher.pool.idle.qsize() <= 2
+    fetcher.close()
+    assert fetcher.pool.idle.qsize() == 0
+
+
+def test_scraper_from_fetched_info(server):
+    fetcher = FetchCoordinator(base_url=server.url)
+    info = fetcher.fetch_all(data=("info",), vehicle_types=("privateCar",))[("info", "privateCar", "zh_TW")]
+    requests = server.requests
+    scraper = CarparkScraper(vehicle_type="privateCar", info=info, fetcher=fetcher)
+    tables = scraper.build_tables(infos=[info for info in TABLES if info != "vacancy"])
+    assert len(tables["basic_info"]) == len(info)
+    assert server.requests == requests
+
+
+def test_poller_scraper_takes_info(server):
+    fetcher = FetchCoordinator(base_url=server.url)
+    info = fetcher.fetch(data="info", vehicle_type="privateCar")
+    poller = VacancyPoller("privateCar", fetcher=fetcher, info=info)
+    assert len(poller.scraper.get_table("address")) == len(info)
+
+
+
+def test_fetch_from_closing_server():
+    # An HTTP/1.0 server closes the connection after each response, nothing is left to drain or reuse
+    with StubServer(50, keep_alive=False) as server:
+        fetcher = FetchCoordinator(base_url=server.url)
+        assert len(fetcher.fetch(data="vacancy", vehicle_type="privateCar")) == 50
+        assert len(fetcher.fetch(data="vacancy", vehicle_type="privateCar", deadline=5)) == 50
+        assert sum(1 for _ in fetcher.stream(data="vacancy", vehicle_type="privateCar")) == 50
+        scraper = CarparkScraper(vehicle_type="privateCar", fetcher=fetcher)
+        scraper.get_data(data="info")
+        assert len(scraper.info) == 50
+        assert fetcher.pool.idle.qsize() == 0
+
+
+def test_tables_straight_after_construction(server, tmp_path):
+    # Nothing is fetched before the first table, which fetches the info and the vacancy on first use
+    fetcher = FetchCoordinator(base_url=server.url)
+    assert len(CarparkScraper(vehicle_type="privateCar", fetcher=fetcher).get_table("address")) > 0
+    CarparkScraper(vehicle_type="privateCar", fetcher=fetcher).save_csv(str(tmp_path), "basic_info")
+    assert (tmp_path / "basic_info.csv").exists()
+    tables = CarparkScraper(vehicle_type="privateCar", fetcher=fetcher).save_all(str(tmp_path / "all"))
+    assert len(tables["basic_info"]) == 100
+    assert 0 < len(tables["vacancy"]) <= 100
+    report = CarparkScraper(vehicle_type="privateCar", fetcher=fetcher).memory_report()
+    assert list(report.index) == list(TABLES)
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from public_holidays import HolidayCalendar, parse_holidays
+
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "2025.htm")
+
+
+@pytest.fixture
+def calendar(tmp_path):
+    shutil.copy(FIXTURE, tmp_path / "2025.htm")
+    return HolidayCalendar(directory=str(tmp_path), offline=True)
+
+
+def test_parse_holidays():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        holidays = parse_holidays(f.read(), 2025)
+    # The header row is skipped
+    assert len(holidays) == 17
+    assert holidays[0] == {"name": "The first day of January", "date": "2025-01-01", "weekday": "Wednesday"}
+    assert holidays[-1]["date"] == "2025-12-26"
+
+
+def test_saved_page_is_kept_as_json(calendar, tmp_path):
+    assert not os.path.exists(calendar.path(2025))
+    holidays = calendar.holidays(2025)
+    assert len(holidays) == 17
+    with open(calendar.path(2025), "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["year"] == 2025 and len(saved["holidays"]) == 17
+    # The next calendar reads the json, even without the page
+    os.remove(tmp_path / "2025.htm")
+    assert HolidayCalendar(directory=str(tmp_path), offline=True).is_holiday("2025-10-01")
+
+
+def test_offline_without_saved_year(calendar):
+    with pytest.raises(FileNotFoundError):
+        calendar.load(2024)
+
+
+def test_is_holiday_scalar(calendar):
+    assert calendar.is_holiday("2025-12-25")
+    assert calendar.is_holiday(pd.Timestamp("2025-01-29 18:30"))
+    assert not calendar.is_holiday("2025-12-24")
+
+
+def test_is_holiday_array(calendar):
+    dates = np.array([["2025-01-01", "2025-01-02"], ["2025-05-31", "NaT"]], dtype="datetime64[ns]")
+    assert calendar.is_holiday(dates).tolist() == [[True, False], [True, False]]
+    assert calendar.is_holiday(pd.Series(["2025-07-01", "2025-07-02"])).tolist() == [True, False]
+
+
+def test_fixed_dates_never_load():
+    calendar = HolidayCalendar(directory="/nonexistent", offline=True, dates=["2030-01-01"])
+    assert calendar.is_holiday("2030-01-01")
+    assert not calendar.is_holiday("2031-01-01")
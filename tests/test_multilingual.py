@@ -0,0 +1,45 @@
+import pytest
+from fetcher import FetchCoordinator
+from multilingual import LOCALIZED_TABLES, MultilingualScraper
+from vehicles import CarparkScraper
+
+LANGS = ("zh_TW", "en_US", "zh_CN")
+
+
+@pytest.fixture
+def fetcher(server):
+    return FetchCoordinator(base_url=server.url)
+
+
+def test_localized_columns_match_single_language(fetcher):
+    multilingual = MultilingualScraper("privateCar", langs=LANGS, fetcher=fetcher)
+    multilingual.get_data(data="info")
+    for lang in LANGS:
+        scraper = CarparkScraper(vehicle_type="privateCar", lang=lang, fetcher=fetcher)
+        scraper.get_data(data="info")
+        for info in LOCALIZED_TABLES:
+            table, single = multilingual.get_table(info), scraper.get_table(info)
+            localized = [col for col in single.columns if f"{col}_{lang}" in table.columns]
+            assert localized, info
+            for col in localized:
+                assert table[f"{col}_{lang}"].astype(str).tolist() == single[col].astype(str).tolist(), (info, col, lang)
+
+
+def test_vacancy_is_fetched_once(fetcher, server):
+    multilingual = MultilingualScraper("privateCar", langs=LANGS, fetcher=fetcher)
+    requests = server.requests
+    multilingual.get_data(data="vacancy")
+    assert server.requests - requests == 1
+    # The info of every language, and the vacancy table from the vacancy already fetched
+    multilingual.get_data(data="info")
+    multilingual.get_table("vacancy")
+    assert server.requests - requests == 1 + len(LANGS)
+
+
+def test_info_after_vacancy_keeps_vacancy_park_ids(fetcher):
+    multilingual = MultilingualScraper("privateCar", langs=LANGS, fetcher=fetcher)
+    multilingual.scraper.refresh(data="vacancy", park_ids=["3", "1", "2"])
+    multilingual.get_data(data="info")
+    # Only the car parks of the vacancy, not the 100 of the info
+    assert sorted(multilingual.scraper.park_ids) == ["1", "2", "3"]
+    assert len(multilingual.get_table("basic_info")) == 3
@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+from helpers import make_scraper, normalized_table, per_id_table
+from normalize import TABLE_COLUMNS
+from vehicles import TABLES
+
+
+@pytest.fixture(scope="module")
+def scraper():
+    return make_scraper(200)
+
+
+@pytest.mark.parametrize("info", TABLES)
+def test_normalizer_matches_accessors(scraper, info):
+    # The columnar normalizer builds the same rows as the accessors called per car park
+    pd.testing.assert_frame_equal(normalized_table(scraper, info), per_id_table(scraper, info), check_dtype=False)
+
+
+@pytest.mark.parametrize("info", TABLES)
+def test_get_table_has_declared_columns(scraper, info):
+    table = scraper.get_table(info)
+    assert list(table.columns) == TABLE_COLUMNS[info]
+    assert len(table) == len(per_id_table(scraper, info))
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import pytest
+from fetcher import FetchCoordinator
+from service import MAX_NEARBY, SnapshotService
+
+
+@pytest.fixture
+def service(server):
+    service = SnapshotService(fetcher=FetchCoordinator(base_url=server.url))
+    service.refresh_vacancy()
+    service.refresh_info()
+    return service
+
+
+def get(service, target: str) -> tuple:
+    _, status, _, body = service.route("GET", target)
+    return status, json.loads(body)
+
+
+def test_carpark_joins_info_and_vacancy(service):
+    status, carpark = get(service, "/carpark/1")
+    assert status == 200
+    assert carpark["park_id"] == "1"
+    assert carpark["vacancy"] == service.poller.snapshot.get("1")
+    assert get(service, "/carpark/missing")[0] == 404
+
+
+@pytest.mark.parametrize("query", ["lat=nan&lon=114.1", "lat=1e308&lon=1e308", "lat=22.3&lon=181", "lat=22.3&lon=114.1&k=0",
+                                   "lat=22.3&lon=114.1&k=-1", "lat=22.3&lon=114.1&radius=-1",
+                                   "lat=22.3&lon=114.1&radius=inf", "lat=22.3"])
+def test_invalid_nearby_is_rejected(service, query):
+    assert get(service, f"/nearby?{query}")[0] == 400
+
+
+def test_nearby_caps_k(service):
+    status, nearby = get(service, "/nearby?lat=22.3&lon=114.1&k=100000&min_vacancy=")
+    assert status == 200
+    assert len(nearby["results"]) == MAX_NEARBY
+
+
+def test_server_keeps_serving_after_bad_query(service):
+    async def request(port: int, target: str) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode("latin-1"))
+        response = await asyncio.wait_for(reader.read(), timeout=5)
+        writer.close()
+        return response.split(b" ", 2)[1]
+
+    async def run():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            assert await request(port, "/nearby?lat=nan&lon=114.1") == b"400"
+            assert await request(port, "/vacancy") == b"200"
+
+    asyncio.run(run())
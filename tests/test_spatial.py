@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from spatial import CarparkLocator, haversine
+
+
+@pytest.fixture
+def locator():
+    rng = np.random.default_rng(0)
+    latitude, longitude = rng.uniform(22.2, 22.5, 500), rng.uniform(113.9, 114.3, 500)
+    locator = CarparkLocator([str(i) for i in range(500)], latitude, longitude)
+    locator.vacancy[:] = rng.integers(0, 5, 500)
+    return locator
+
+
+def test_nearest_matches_full_scan(locator):
+    distances = haversine(22.3, 114.1, locator.latitude, locator.longitude)
+    eligible = np.flatnonzero(locator.vacancy >= 1)
+    expected = eligible[np.argsort(distances[eligible], kind="stable")[:5]]
+    assert [result["park_id"] for result in locator.nearest(22.3, 114.1, k=5, min_vacancy=1)] == \
+        list(locator.park_ids[expected])
+
+
+def test_nearest_from_far_away_ends(locator):
+    assert len(locator.nearest(-89.9, -179.9, k=3)) == 3
+    assert len(locator.within(22.3, 114.1, 1e9)) == len(locator)
+
+
+@pytest.mark.parametrize("latitude, longitude", [(float("nan"), 114.1), (1e308, 1e308), (22.3, 200), (91, 114.1),
+                                                 (22.3, float("inf"))])
+def test_invalid_points_are_rejected(locator, latitude, longitude):
+    with pytest.raises(ValueError):
+        locator.nearest(latitude, longitude)
+    with pytest.raises(ValueError):
+        locator.within(latitude, longitude, 1)
+
+
+def test_invalid_k_and_radius_are_rejected(locator):
+    with pytest.raises(ValueError):
+        locator.nearest(22.3, 114.1, k=0)
+    with pytest.raises(ValueError):
+        locator.within(22.3, 114.1, -1)
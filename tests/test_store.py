@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+from poller import VacancySnapshot
+from store import VacancyStore
+
+
+def make_results(vacancies: dict, last_update: str) -> list:
+    return [{"park_Id": park_id, "privateCar": [{"vacancy_type": "A", "vacancy": vacancy, "lastupdate": last_update}]}
+            for park_id, vacancy in vacancies.items()]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with VacancyStore(str(tmp_path), "privateCar") as store:
+        store.append_snapshot(VacancySnapshot("privateCar", make_results({"1": 10, "2": 20}, "2025-01-01 12:00:00")))
+        store.append_snapshot(VacancySnapshot("privateCar", make_results({"1": 11, "2": 21}, "2025-01-01 12:05:00")))
+        store.append_snapshot(VacancySnapshot("privateCar", make_results({"1": 12}, "2025-01-01 12:10:00")))
+        yield store
+
+
+def test_journal_mode_is_wal(store):
+    assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_same_snapshot_adds_no_rows(store):
+    snapshot = VacancySnapshot("privateCar", make_results({"1": 12}, "2025-01-01 12:10:00"))
+    assert store.append_snapshot(snapshot) == 1
+    assert store.append(store.query()) == 5
+    assert len(store.query()) == 5
+
+
+def test_query_filters_the_range(store):
+    history = store.query("1", start="2025-01-01 12:05:00", end="2025-01-01 12:10:00")
+    assert history["vacancy"].tolist() == [11, 12]
+    assert (history["park_id"] == "1").all()
+    assert len(store.query(start="2025-01-01 12:05:00")) == 3
+    assert store.query("3").empty
+
+
+def test_latest_is_the_last_update(store):
+    latest = store.latest().set_index("park_id")
+    assert latest.loc["1", "last_update"] == pd.Timestamp("2025-01-01 12:10:00")
+    assert latest.loc["1", "vacancy"] == 12
+    assert latest.loc["2", "last_update"] == pd.Timestamp("2025-01-01 12:05:00")
+    assert latest.loc["2", "vacancy"] == 21
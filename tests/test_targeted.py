@@ -0,0 +1,73 @@
+import numpy as np
+from fetcher import FetchCoordinator, split_extent
+from poller import VacancySnapshot
+from vehicles import CarparkScraper
+
+
+def test_ids_are_batched(server):
+    fetcher = FetchCoordinator(base_url=server.url)
+    park_ids = [str(i) for i in range(1, 101)] + ["1", "2"]
+    requests = server.requests
+    results = fetcher.fetch_targeted("info", "privateCar", park_ids=park_ids, batch_size=40)
+    # 100 distinct ids in batches of 40, 40 and 20
+    assert server.requests - requests == 3
+    assert sorted(int(record["park_Id"]) for record in results) == list(range(1, 101))
+
+
+def test_tiles_return_each_carpark_once(server):
+    fetcher = FetchCoordinator(base_url=server.url)
+    longitude, latitude = server.locations["1"]
+    # The border between the two tiles runs through car park 1, which both tiles return
+    extent = (longitude - 0.5, latitude - 0.5, longitude + 0.5, latitude + 0.5)
+    requests = server.requests
+    results = fetcher.fetch_targeted("info", "privateCar", extent=extent, tiles=(2, 1))
+    assert server.requests - requests == 2
+    park_ids = [record["park_Id"] for record in results]
+    assert len(park_ids) == len(set(park_ids)) == 100
+    # Without the merge car park 1 would come twice
+    assert sum(len(fetcher.fetch("info", "privateCar", extent=tile)) for tile in split_extent(extent, (2, 1))) == 101
+
+
+def test_refresh_merges_into_info(server):
+    fetcher = FetchCoordinator(base_url=server.url)
+    info = fetcher.fetch("info", "privateCar")
+    scraper = CarparkScraper(vehicle_type="privateCar", info=info[:10], fetcher=fetcher)
+    scraper.refresh(data="info", park_ids=[str(i) for i in range(6, 16)])
+    assert list(scraper.park_ids) == [str(i) for i in range(1, 16)]
+    assert scraper.get_carpark("15") == info[14]
+
+
+def test_refresh_merges_into_vacancy(server):
+    fetcher = FetchCoordinator(base_url=server.url)
+    scraper = CarparkScraper(vehicle_type="privateCar", fetcher=fetcher)
+    stale = [{"park_Id": str(i), "privateCar": [{"vacancy_type": "A", "vacancy": 999, "lastupdate": "2024-01-01 00:00:00"}]}
+             for i in range(1, 11)]
+    scraper.load_data(data="vacancy", results=stale)
+    results = scraper.refresh(data="vacancy", park_ids=["1", "2", "11"])
+    assert len(results) == 3
+    records = {record["park_Id"]: record.get("privateCar") for record in server.records[("vacancy", "privateCar")]}
+    for park_id in ("1", "2", "11"):
+        vacancy = scraper.get_vacancy(park_id)
+        assert (vacancy is None) == (records[park_id] is None)
+        if not vacancy is None:
+            assert vacancy["vacancy"] == records[park_id][0]["vacancy"]
+    # The car parks which were not refreshed keep their vacancy
+    assert scraper.get_vacancy("3")["vacancy"] == 999
+    assert len(scraper.park_ids) == 11
+
+
+def test_snapshot_update_with_new_and_known_ids():
+    def entry(vacancy, vacancy_type="A"):
+        return [{"vacancy_type": vacancy_type, "vacancy": vacancy, "lastupdate": "2025-01-01 12:00:00"}]
+
+    snapshot = VacancySnapshot("privateCar", [{"park_Id": "1", "privateCar": entry(10)},
+                                              {"park_Id": "2", "privateCar": entry(20)}])
+    snapshot.update([{"park_Id": "2", "privateCar": entry(21, "LONG")},
+                     {"park_Id": "3", "privateCar": entry(30)},
+                     {"park_Id": "4"}])
+    assert snapshot.park_ids.tolist() == ["1", "2", "3"]
+    assert snapshot.vacancy.tolist() == [10, 21, 30]
+    assert snapshot.vacancy_type.tolist() == ["A", "LONG", "A"]
+    assert snapshot.get("3")["vacancy"] == 30
+    assert not "4" in snapshot
+    assert not np.isnat(snapshot.last_update).any()
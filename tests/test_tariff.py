@@ -0,0 +1,69 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from tariff import TariffEvaluator
+
+DAYS = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN", "PH"]
+
+
+def charge(type: str, price: float, start: str="00:00", end: str="00:00") -> dict:
+    return {"type": type, "weekdays": DAYS, "periodStart": start, "periodEnd": end, "price": price}
+
+
+@pytest.fixture
+def evaluator():
+    records = [
+        {"park_Id": "mixed", "privateCar": {"hourlyCharges": [charge("hourly", 20), charge("half-hourly", 8)]}},
+        {"park_Id": "hourly", "privateCar": {"hourlyCharges": [charge("hourly", 20)]}},
+        {"park_Id": "day_night", "privateCar": {"hourlyCharges": [charge("hourly", 10, "08:00", "18:00"),
+                                                                  charge("hourly", 30, "18:00", "08:00")]}},
+        {"park_Id": "morning", "privateCar": {"hourlyCharges": [charge("hourly", 10, "08:00", "12:00")]}},
+        {"park_Id": "none", "privateCar": {}}
+    ]
+    return TariffEvaluator(records, "privateCar", holidays=())
+
+
+def test_cheapest_unit_prices_the_stay(evaluator):
+    price = evaluator.price("2025-03-04 10:00", "2025-03-04 12:00")
+    assert price["mixed"] == 32
+    assert price["hourly"] == 40
+    assert price["morning"] == 20
+    assert np.isnan(price["none"])
+
+
+def test_stay_across_periods(evaluator):
+    price = evaluator.price("2025-03-04 17:00", "2025-03-04 19:30")
+    assert price["day_night"] == 70
+    assert np.isnan(price["morning"])
+
+
+PH_RECORDS = [{
+    "park_Id": "ph",
+    "openingHours": [{"weekdays": DAYS[:5], "excludePublicHoliday": True, "periodStart": "08:00", "periodEnd": "20:00"}],
+    "privateCar": {"hourlyCharges": [
+        {"type": "hourly", "weekdays": DAYS[:5], "excludePublicHoliday": True, "periodStart": "00:00",
+         "periodEnd": "00:00", "price": 20},
+        {"type": "hourly", "weekdays": ["SAT", "SUN", "PH"], "periodStart": "00:00", "periodEnd": "00:00", "price": 50}
+    ]}
+}]
+
+
+def test_public_holidays_by_default(tmp_path, monkeypatch):
+    # The default calendar reads the saved page of ./holidays instead of fetching gov.hk
+    os.makedirs(tmp_path / "holidays")
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "2025.htm"),
+                tmp_path / "holidays" / "2025.htm")
+    monkeypatch.chdir(tmp_path)
+    evaluator = TariffEvaluator(PH_RECORDS, "privateCar")
+    # National Day is a Wednesday
+    assert evaluator.price("2025-10-01 10:00", "2025-10-01 12:00")["ph"] == 100
+    assert not evaluator.is_open("2025-10-01 10:00")["ph"]
+    assert evaluator.price("2025-10-08 10:00", "2025-10-08 12:00")["ph"] == 40
+    assert evaluator.is_open("2025-10-08 10:00")["ph"]
+
+
+def test_public_holidays_as_dates():
+    evaluator = TariffEvaluator(PH_RECORDS, "privateCar", holidays=["2025-10-08"])
+    assert evaluator.price("2025-10-08 10:00", "2025-10-08 12:00")["ph"] == 100
+    assert TariffEvaluator(PH_RECORDS, "privateCar", holidays=()).price("2025-10-01 10:00", "2025-10-01 12:00")["ph"] == 40
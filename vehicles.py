@@ -7,88 +7,164 @@ import sqlite3
 import sys
 import os
 from Scraper import *
-from bs4 import BeautifulSoup
-from urllib.request import urlopen
-from urllib.parse import urlencode
+from normalize import TABLE_COLUMNS, TableNormalizer, chunked, normalize_vacancy
+from fetcher import FetchCoordinator, build_params, check_input
+from changes import ChangeDetector, SnapshotDiff
+from schema import DATATYPES, apply_schema, downcast, memory_report
+from public_holidays import HolidayCalendar
+from metrics import configure_logging, logger
 import urllib
 
 
+# Dates are written in full like the API, whatever the times in the rows written together
+CSV_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+TABLES = ("address", "basic_info", "height_limits", "opening_hours", "grace_periods", "vacancy", "charges")
+
+
 class CarparkScraper(Scraper):
-    def __init__(self, vehicle_type: str, lang: str="zh_TW"):
+    def __init__(self, vehicle_type: str, lang: str="zh_TW", info: list=None, fetcher: FetchCoordinator=None):
+        """
+        info takes the results already fetched, e.g. by FetchCoordinator.fetch_all, instead of fetching again
+        Otherwise the info is fetched on first use, so a scraper only polling vacancy never fetches it.
+        """
         self.vehicle_type = vehicle_type
         self.lang = lang
-        self.info = self.get_data(data="info")
-        self.vacancy = None
+        # Reuse the keep-alive connections of the fetcher for every get_data
+        self.fetcher = FetchCoordinator() if fetcher is None else fetcher
+        # Stages are timed in the metrics of the fetcher
+        self.metrics = self.fetcher.metrics
         self.park_ids = None
+        self.info = None
+        if not info is None:
+            # The park_ids of the info, like get_data
+            self.load_data(data="info", results=info)
+        self.vacancy = None
+        # Latest snapshot of each table to emit only the changed car parks
+        self.changes = ChangeDetector()
+
+    @property
+    def info(self) -> list:
+        """Raw info records of the latest fetch, fetched on first use"""
+        if self._info is None:
+            # Keep the park_ids of the latest get_data, if any
+            park_ids = self.park_ids
+            self.get_data(data="info")
+            if not park_ids is None:
+                self.park_ids = park_ids
+        return self._info
+
+    @info.setter
+    def info(self, results: list) -> None:
+        # Rebuild the park_Id index whenever the info is refreshed
+        self._info = results
+        self._info_index = {} if results is None else {str(record["park_Id"]): record for record in results}
+
+    @property
+    def vacancy(self) -> pd.DataFrame:
+        """Vacancy of the vehicle type of the latest fetch"""
+        return self._vacancy
+
+    @vacancy.setter
+    def vacancy(self, results: pd.DataFrame) -> None:
+        # Rebuild the park_Id index whenever the vacancy is refreshed
+        self._vacancy = results
+        self._vacancy_index = {}
+        if not results is None:
+            for park_id, vacancies in zip(results["park_Id"], results[self.vehicle_type]):
+                # Carparks without vacancy of the vehicle type are filled with NaN by pandas
+                self._vacancy_index[str(park_id)] = vacancies if isinstance(vacancies, list) else None
+
+    def get_carpark(self, park_id: str) -> dict:
+        """Takes in the park_id and returns the raw info record of that car park"""
+        if self._info is None:
+            # Fetch the info on first use
+            self.info
+        return self._info_index[str(park_id)]
 
 
     def check_input(self, data: str, vehicle_type: str, lang: str) -> None:
         """Validate the input of params"""
-        input_choice = {
-            "data": ("info", "vacancy"),
-            "vehicleTypes": ("privateCar", "LGV", "HGV", "CV", "coach", "motorCycle"),
-            "lang": ("en_US", "zh_TW", "zh_CN")
-        }
-        if not data in input_choice["data"]:
-            raise ValueError(f"Input should be one of {input_choice['data']}. Got {data}.")
-        if not vehicle_type in input_choice["vehicleTypes"]:
-            raise ValueError(f"Input should be one of {input_choice['vehicleTypes']}. Got {vehicle_type}.")
-        if not lang in input_choice["lang"]:
-            raise ValueError(f"Input should be one of {input_choice['lang']}. Got {lang}.")
-
-    def get_data(self, data: str="info", lang: (str, None)="zh_TW", carpark_id=None, extent=None) -> list:
+        check_input(data=data, vehicle_type=vehicle_type, lang=lang)
+
+    def get_data(self, data: str="info", lang: (str, None)=None, carpark_id=None, extent=None) -> list:
         """
         https://api.data.gov.hk/v1/carpark-info-vacancy?data=<param>&vehicleTypes=<param>&carparkIds=<param>&extent=<param>&lang=<param>
         data = "info" or "vacancy"
         vehicleTypes = "privateCar", "LGV", "HGV", "CV", "coach", "motorCycle"
-        lang = "en_US", "zh_TW", "zh_CN"
+        lang = "en_US", "zh_TW", "zh_CN", the lang of the scraper if None
+        If the API fails, the info or vacancy of the last good fetch is kept and returned, the error is
+        raised if there is none.
         """
-        # Check if the data type is valid
-        self.check_input(data=data, vehicle_type=self.vehicle_type, lang=lang)
-
-        params = {
-            "data": data,
-            "vehicleTypes": self.vehicle_type,
-            "lang": lang
-        }
-        if not carpark_id is None:
-            params["carparkIds"] = carpark_id
-        if not extent is None:
-            params["extent"] = extent
-
-        base_url = "https://api.data.gov.hk/v1/carpark-info-vacancy"
-
-        # Encode parameters as query string
-        query_string = urlencode(params)
-
-        # Construct full URL with query parameters
-        full_url = f"{base_url}?{query_string}"
+        lang = self.lang if lang is None else lang
+        # Check if the data type is valid and encode them as query parameters
+        params = build_params(data=data, vehicle_type=self.vehicle_type, lang=lang, carpark_id=carpark_id, extent=extent)
 
+        labels = {"data": data, "vehicle_type": self.vehicle_type}
         try:
-            with urlopen(full_url) as response:
-                response_data = response.read().decode("utf-8")
-                response_data = json.loads(response_data)  # Parse the response data
-            print("Response code:", response.getcode())
-        except urllib.error.HTTPError as HTTPError:
-            print(f"Error: Unable to connect to the API:\n{HTTPError}")
-
-        results = response_data["results"]
+            response = self.fetcher.get(params)
+            with self.metrics.timer("parse_seconds", **labels):
+                response_data = json.loads(response.body.decode("utf-8"))  # Parse the response data
+            logger.info("Fetched %s of %s: status %s, %d bytes, %d records", data, self.vehicle_type,
+                        response.status, len(response.body), len(response_data["results"]))
+        except (urllib.error.URLError, ValueError) as error:
+            # The API failed after the retries of the fetcher, or its response was cut off
+            self.metrics.increment("fetch_errors_total", **labels)
+            last_good = self._info if data == "info" else self._vacancy
+            if last_good is None:
+                logger.error("Unable to connect to the API: %s", error)
+                raise
+            logger.warning("Unable to connect to the API, keeping the last good %s of %s: %s",
+                           data, self.vehicle_type, error)
+            return last_good
+
+        return self.load_data(data=data, results=response_data["results"])
+
+    def load_data(self, data: str, results: list) -> list:
+        """Takes in the results of the API, e.g. fetched by FetchCoordinator, and stores them as info or vacancy"""
+        if not data in ("info", "vacancy"):
+            raise ValueError(f"Input should be one of ('info', 'vacancy'). Got {data}.")
+        # Setting info or vacancy rebuilds the park_Id index of the accessors
         if data == "info":
             self.info = results
+            self.park_ids = np.asarray(list(self._info_index), dtype=object)
         elif data == "vacancy":
             results = pd.DataFrame(results).loc[: , ["park_Id", self.vehicle_type]]
             self.vacancy = results
-        self.park_ids = pd.DataFrame(results)["park_Id"].unique()
+            self.park_ids = results["park_Id"].unique()
+        return results
+
+    def refresh(self, data: str="vacancy", park_ids=None, extent=None, lang: str=None, batch_size: int=50,
+                tiles=(1, 1)) -> list:
+        """
+        Fetch only the car parks of park_ids or inside the bounding box extent "minX,minY,maxX,maxY"
+        and merge them into the info or vacancy, the other car parks keep the data of the latest fetch.
+        The queries are batched and run concurrently by FetchCoordinator.fetch_targeted. Returns the refreshed results.
+        """
+        lang = self.lang if lang is None else lang
+        results = self.fetcher.fetch_targeted(data=data, vehicle_type=self.vehicle_type, lang=lang, park_ids=park_ids,
+                                              extent=extent, batch_size=batch_size, tiles=tiles)
+        if data == "info":
+            records = dict(self._info_index)
+            records.update((str(record["park_Id"]), record) for record in results)
+            self.info = list(records.values())
+            self.park_ids = np.asarray(list(self._info_index), dtype=object)
+        elif data == "vacancy":
+            vacancies = dict(self._vacancy_index)
+            for record in results:
+                vacancy = record.get(self.vehicle_type)
+                vacancies[str(record["park_Id"])] = vacancy if isinstance(vacancy, list) else None
+            self.vacancy = pd.DataFrame({"park_Id": list(vacancies), self.vehicle_type: list(vacancies.values())})
+            self.park_ids = self.vacancy["park_Id"].unique()
         return results
 
     def get_vacancy(self, park_id: str) -> dict:
         """Takes in the park_id returns the vacancy information of that car park"""
-        carpark = pd.DataFrame(self.vacancy).set_index("park_Id").loc[str(park_id)]
+        vacancies = self._vacancy_index[str(park_id)]
         # Return none if vacancy for the vehicle type is unavailable
         vacancy = None
-        if not carpark.get(self.vehicle_type) is np.nan:
+        if not vacancies is None:
             # Extract info from the dictionary of carpark vacancy
-            vacancy_raw = carpark.get(self.vehicle_type)[0]
+            vacancy_raw = vacancies[0]
             vacancy = {
                 "park_id": park_id,
                 "vehicle_type": self.vehicle_type,
@@ -101,7 +177,7 @@ class CarparkScraper(Scraper):
 
     def get_basic_info(self, park_id: str) -> dict:
         """Takes in the park_id and returns the basic information of that car park"""
-        carpark = pd.DataFrame(self.info).set_index("park_Id").loc[str(park_id)]
+        carpark = self.get_carpark(park_id)
         basic_info = {
             "park_id": park_id,
             "name": carpark.get("name"),
@@ -122,7 +198,7 @@ class CarparkScraper(Scraper):
         }
 
         rendition_urls = carpark.get("renditionUrls")
-        if not rendition_urls is np.nan:
+        if not rendition_urls is None:
             basic_info["square"] = rendition_urls.get("square")
             basic_info["thumbnail"] = rendition_urls.get("thumbnail")
             basic_info["banner"] = rendition_urls.get("banner")
@@ -132,12 +208,12 @@ class CarparkScraper(Scraper):
 
     def get_address(self, park_id: str) -> dict:
         """Takes in the park_id and return the address of that car park."""
-        carpark = pd.DataFrame(self.info).set_index("park_Id").loc[str(park_id)]
+        carpark = self.get_carpark(park_id)
         return_address = {
             "park_id": park_id,
             "full_address": carpark.get("displayAddress")
         }
-        if not carpark.get("address") is np.nan:
+        if not carpark.get("address") is None:
             address = carpark["address"]
             unit_no = address.get("unitNo")
             if isinstance(unit_no, tuple):
@@ -203,9 +279,9 @@ class CarparkScraper(Scraper):
 
     def get_grace_periods(self, park_id: str) -> list:
         """Takes in the park_id and returns the grace periods of that car park."""
-        carpark = pd.DataFrame(self.info).set_index("park_Id").loc[str(park_id)]
+        carpark = self.get_carpark(park_id)
         grace_periods = []
-        if not carpark.get("gracePeriods") is np.nan:
+        if not carpark.get("gracePeriods") is None:
             # Iterate through all the grace periods
             for period in carpark.get("gracePeriods"):
                 grace_period = {
@@ -218,9 +294,9 @@ class CarparkScraper(Scraper):
 
     def get_height_limits(self, park_id) -> list:
         """Takes in the park_id and returns the height limits of that car park."""
-        carpark = pd.DataFrame(self.info).set_index("park_Id").loc[str(park_id)]
+        carpark = self.get_carpark(park_id)
         height_limits = []
-        if not carpark.get("heightLimits") is np.nan:
+        if not carpark.get("heightLimits") is None:
             for height_limit in carpark.get("heightLimits"):
                 height_limit_info = {
                     "park_id": park_id,
@@ -233,9 +309,9 @@ class CarparkScraper(Scraper):
 
     def get_opening_hours(self, park_id: str) -> list:
         """Takes in the park_id and returns the opening hours of that car park."""
-        carpark = pd.DataFrame(self.info).set_index("park_Id").loc[str(park_id)]
+        carpark = self.get_carpark(park_id)
         opening_hours = []
-        if not carpark.get("openingHours") is np.nan:
+        if not carpark.get("openingHours") is None:
             # Iterate through all the opening hour
             for hour in carpark.get("openingHours"):
                 opening_hour = {
@@ -252,11 +328,11 @@ class CarparkScraper(Scraper):
         """Takes in the park_id and returns the charges information of that car park."""
         if not mode in ("privileges", "monthlyCharges", "hourlyCharges", "dayNightParks", "unloadings"):
             raise ValueError("Please try again with other mode of charges.")
-        carpark = pd.DataFrame(self.info).set_index("park_Id").loc[str(park_id)]
+        carpark = self.get_carpark(park_id)
 
         charges = []
         # Check if the carpark has the vehicle type information
-        if not carpark.get(self.vehicle_type) in (None, np.nan):
+        if not carpark.get(self.vehicle_type) is None:
             if not carpark.get(self.vehicle_type).get(mode) is None:
                 for charge in carpark.get(self.vehicle_type).get(mode):
                     charge_clean = {}
@@ -336,111 +412,130 @@ class CarparkScraper(Scraper):
         return charges
 
 
-    def get_table(self, info: str) -> pd.DataFrame:
-        """Get the DataFrame of the relevant information"""
-
-        ## Get_charges function need to specify mode of parking
-        #if info == "charges" and park_mode is None:
-        #    raise ValueError("Please provide the parking mode.")
-
-        info_list = []
-        for id in self.park_ids:
-            print("Currently processing " + info + " of carpark : " + id)
-            if info == "charges":
-                park_modes = ("privileges", "monthlyCharges", "hourlyCharges", "dayNightParks", "unloadings")
-                self.method = self.get_charges
-                element = [] 
-                for park_mode in park_modes:
-                    charge = self.method(park_id=id, mode=park_mode)
-                    if isinstance(charge, list):
-                        element.extend(charge)
-                    elif isinstance(charge, dict):
-                        element.append(charge)
-            else:
-                if info == "vacancy":
-                    self.method = self.get_vacancy
-                elif info == "grace_periods":
-                    self.method = self.get_grace_periods
-                elif info == "height_limits":
-                    self.method = self.get_height_limits
-                elif info == "opening_hours":
-                    self.method = self.get_opening_hours
-                elif info == "basic_info":
-                    self.method = self.get_basic_info
-                elif info == "address":
-                    self.method = self.get_address
-                element = self.method(park_id=id)
-            if isinstance(element, list):
-                info_list.extend(element)
-            elif isinstance(element, dict):
-                info_list.append(element)
-
-        # Define the datatype
-        datatype = {
-            "park_id": "string",
-            "type": "category",
-            "weekdays": "string",
-            "exclude_public_holiday": bool,
-            "period_start": "string",
-            "period_end": "string",
-            "price": "Int64",
-            "usage_threshold": "string",
-            "covered": "category",
-            "remark": "string",
-            "space": "Int64",
-            "space_dis": "Int64",
-            "space_ev": "Int64",
-            "space_unl": "Int64",
-            "description": "string",
-            "ranges": "string",
-            "reserved": "category",
-            "valid_until": "category",
-            "valid_until_end": "string",
-            "full_address": "string",
-            "floor": "category",
-            "building_name": "string",
-            "street_name": "string",
-            "building_no": "Int64",
-            "sub_district": "string",
-            "dc_district": "string",
-            "region": "string",
-            "height": "float16",
-            "remark": "string",
-            "vehicle_type": "category",
-            "vacancy_type": "string",
-            "vacancy": "int16",
-            "last_update": "string",
-            "create_date": "datetime64[ns]",
-            "modified_date": "datetime64[ns]",
-            "published_date": "datetime64[ns]"
-        }
+    def get_table(self, info: str, typed: bool=True, compact: bool=False) -> pd.DataFrame:
+        """
+        Get the DataFrame of the relevant information
+        With typed, the columns are converted to the declared datatypes, the columns which cannot be
+        converted are kept as they are and reported in dataframe.attrs["schema_errors"]. With compact,
+        they are also downcast to the smallest types holding the values, which can differ between snapshots.
+        """
+
+        return self.build_tables(infos=(info,), typed=typed, compact=compact)[info]
 
+    def build_tables(self, infos=TABLES, typed: bool=True, compact: bool=False) -> dict:
+        """
+        Build the tables in one pass over the records, keyed by info
+        The records are turned into columns and their nested fields flattened once for all the tables.
+        """
+        if self.park_ids is None:
+            # Fetch the info on first use, its park_ids key every table
+            self.info
+        tables = {}
+        normalizer = None
+        for info in infos:
+            # Build the whole table with column operations over all the car parks at once
+            labels = {"table": info, "vehicle_type": self.vehicle_type}
+            with self.metrics.timer("normalize_seconds", **labels):
+                if info == "vacancy":
+                    if self.vacancy is None:
+                        # Fetch the vacancy on first use, keeping the park_ids of the info
+                        park_ids = self.park_ids
+                        self.get_data(data="vacancy")
+                        self.park_ids = park_ids
+                    vacancies = [self._vacancy_index.get(str(id)) for id in self.park_ids]
+                    table = normalize_vacancy(self.park_ids, vacancies, self.vehicle_type)
+                else:
+                    if normalizer is None:
+                        records = [self.get_carpark(id) for id in self.park_ids]
+                        normalizer = TableNormalizer(records, self.vehicle_type, park_ids=self.park_ids)
+                    table = normalizer.table(info)
+            with self.metrics.timer("format_seconds", **labels):
+                # Every table has all its columns in a fixed order, the same as the chunks of iter_tables
+                tables[info] = self.format_table(table.reindex(columns=TABLE_COLUMNS[info]), typed=typed,
+                                                 compact=compact)
+            self.metrics.increment("rows_total", len(table), **labels)
+        return tables
+
+    def format_table(self, table: pd.DataFrame, typed: bool=True, compact: bool=False) -> pd.DataFrame:
+        """Clean the missing values and times of the normalized table and convert it to the declared datatypes"""
         dataframe = None
-        if info_list:
+        if not table.empty:
             # Replace np.nan with None
-            dataframe = pd.DataFrame(info_list).fillna(np.nan)
+            dataframe = table.fillna(np.nan)
         # Quit the function if there is no information in that vehicle type
         else:
             return
 
         # Replace the NaN values in the columns of datatype string 
-        for col in datatype.keys():
+        for col in DATATYPES.keys():
             if col in dataframe.columns:
                 if col in ("period_end", "period_start", "valid_until_end", "last_update"):
                     # Convert the columns to datetime type
                     dataframe[col] = dataframe[col].replace("24:00", "00:00")
 
-                col_datatype = datatype[col]
+                col_datatype = DATATYPES[col]
                 # Replace the NaN values with "" before turning that column into string type
                 if col_datatype in ("string", "category"):
                     dataframe[col] = dataframe[col].replace(np.nan, "")
-                dataframe.astype({col: datatype[col]})
+        if typed:
+            dataframe = apply_schema(dataframe)
+        if typed and compact:
+            dataframe = downcast(dataframe)
         return dataframe
 
-    def save_sqlite(self, destination: str, info: str) -> None:
-        """Saved the dataframe in the sqlite database in the destination"""
+    def iter_tables(self, infos=TABLES, chunk_size: int=1000, lang: str=None, typed: bool=True):
+        """
+        Stream the records from the API and yield (info, table) for every chunk of chunk_size car parks
+        Only one chunk of records is held in memory, the info and vacancy of the scraper are left unchanged.
+        Every chunk has all the columns of the table so the chunks can be appended to the same file.
+        """
+        groups = {
+            "info": [info for info in infos if info != "vacancy"],
+            "vacancy": [info for info in infos if info == "vacancy"]
+        }
+        for data, tables in groups.items():
+            if not tables:
+                continue
+            records = self.fetcher.stream(data=data, vehicle_type=self.vehicle_type, lang=self.lang if lang is None else lang)
+            for chunk in chunked(records, chunk_size):
+                park_ids = [record["park_Id"] for record in chunk]
+                normalizer = None if data == "vacancy" else TableNormalizer(chunk, self.vehicle_type, park_ids=park_ids)
+                for info in tables:
+                    if info == "vacancy":
+                        vacancies = [record.get(self.vehicle_type) for record in chunk]
+                        table = normalize_vacancy(park_ids, vacancies, self.vehicle_type)
+                    else:
+                        table = normalizer.table(info)
+                    if table.empty:
+                        continue
+                    table = self.format_table(table.reindex(columns=TABLE_COLUMNS[info]), typed=typed)
+                    yield info, table
+
+    def memory_report(self, infos=TABLES) -> pd.DataFrame:
+        """Get the rows and memory of each table with object columns and with the declared datatypes"""
+        raw_tables, typed_tables, schema_errors = {}, {}, {}
+        for info in infos:
+            raw_tables[info] = self.get_table(info=info, typed=False)
+            typed_tables[info] = None if raw_tables[info] is None else downcast(apply_schema(raw_tables[info]))
+            schema_errors[info] = {} if typed_tables[info] is None else typed_tables[info].attrs["schema_errors"]
+        report = memory_report(typed_tables).rename(columns={"bytes": "typed_bytes"})
+        report.insert(2, "object_bytes", memory_report(raw_tables)["bytes"])
+        report["saving"] = 1 - report["typed_bytes"] / report["object_bytes"].where(report["object_bytes"] > 0)
+        report["schema_errors"] = pd.Series(schema_errors)
+        return report
+
+    def get_changes(self, info: str) -> SnapshotDiff:
+        """Get the rows of the car parks inserted, updated or removed since the previous call with the same info"""
+        return self.changes.update(info, self.get_table(info=info))
+
+    def save_sqlite(self, destination: str, info: str, incremental: bool=False, table: pd.DataFrame=None) -> None:
+        """
+        Saved the dataframe in the sqlite database in the destination
+        With incremental, only the rows of the car parks changed since the previous save are written.
+        table takes the table already built by build_tables instead of building it again.
+        """
 
-        dataframe = self.get_table(info=info)
+        dataframe = self.get_table(info=info) if table is None else table.copy()
 
         # Do not save if the vehicle type has no such information
         if dataframe is None:
@@ -449,67 +544,155 @@ class CarparkScraper(Scraper):
             "period_start": "string",
             "period_end": "string",
             "valid_until_end": "string",
-            "last_update": "string",
-            "create_date": "string",
-            "modified_date": "string",
-            "published_date": "string"
+            "last_update": "string"
         }
         for col in dtypes.keys():
-            try:
-                dataframe.astype({col: dtypes[col]})
-            except Exception:
-                continue
+            if col in dataframe.columns:
+                dataframe[col] = dataframe[col].astype(dtypes[col])
+        for col in dataframe.columns:
+            if pd.api.types.is_datetime64_any_dtype(dataframe[col]):
+                # Dates are written in full like the csv, missing dates as NULL
+                dataframe[col] = dataframe[col].dt.strftime(CSV_DATE_FORMAT)
+            elif dataframe[col].dtype in (np.float16, np.float32):
+                # sqlite only has 64-bit floats, write the shortest decimal of the value, e.g. 2.1 and not 2.099609375
+                dataframe[col] = dataframe[col].astype(str).astype("float64")
+        if incremental:
+            changes = self.changes.diff(info, dataframe, target=f"sqlite:{destination}")
+            # Nothing to write if no car park changed
+            if not changes:
+                return
 
         # Make the desired destination and continue if the desired destination already exists
         os.makedirs(destination, exist_ok=True)
         # Create a sqlite table and write with the corresponding table name
         db_name = os.path.join(destination, f"{self.vehicle_type}.db")
-        with sqlite3.connect(db_name) as conn:
-            dataframe.to_sql(info, conn, if_exists='replace', index=False)
+        labels = {"table": info, "vehicle_type": self.vehicle_type, "format": "sqlite"}
+        with self.metrics.timer("write_seconds", **labels), sqlite3.connect(db_name) as conn:
+            if incremental:
+                table_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                            (info,)).fetchone()
+                if table_exists:
+                    # Delete the rows of the changed car parks and write the current rows of them again
+                    conn.executemany(f'DELETE FROM "{info}" WHERE park_id = ?',
+                                     [(park_id,) for park_id in changes.park_ids])
+                changes.upserts.to_sql(info, conn, if_exists='append', index=False)
+            else:
+                dataframe.to_sql(info, conn, if_exists='replace', index=False)
+        if incremental:
+            # The snapshot only moves on once its changes are written, a failed write is retried in full
+            self.changes.commit(info, dataframe, target=f"sqlite:{destination}")
+        self.metrics.increment("rows_written_total", len(changes.upserts) if incremental else len(dataframe), **labels)
 
-    def save_csv(self, destination: str, info: str):
-        """Saved the dataframe in the csv in the destination"""
+    def save_csv(self, destination: str, info: str, incremental: bool=False, table: pd.DataFrame=None):
+        """
+        Saved the dataframe in the csv in the destination
+        With incremental, the csv is only written again if any car park changed since the previous save.
+        table takes the table already built by build_tables instead of building it again.
+        """
 
-        dataframe = self.get_table(info=info)
+        dataframe = self.get_table(info=info) if table is None else table
         # Do not save if the vehicle type has no such information
         if dataframe is None:
             return
+        if incremental and not self.changes.diff(info, dataframe, target=f"csv:{destination}"):
+            return
         # Make the desired destination and continue if the desired destination already exists
         os.makedirs(destination, exist_ok=True)
         # Create a csv file and write with the corresponding table name
         csv_name = os.path.join(destination, f"{info}.csv")
-        dataframe.set_index("park_id").to_csv(csv_name, index=True, encoding="utf-8-sig")
-
-def get_public_holiday() -> np.ndarray:
-    # Define a ph_dict to hold all the public holidays
-    holiday_url = "https://www.gov.hk/en/about/abouthk/holiday/2025.htm"
-    html_content = Scraper(url=holiday_url, decode="utf-8").openurl()
-    soup = BeautifulSoup(html_content, features="html.parser")
-    table = soup.find_all("table")[0]
-    table_rows = table.find_all("tr")
-
-    def get_table_data(table_row_input):
-        """Get the table data from a table row"""
-        table_data = table_row_input.find_all("td")
-        name, date, weekday = [*map(lambda x: x.get_text(strip=True), table_data)]
-        return np.array((name, date, weekday), dtype="U50")
-
-    ph_array = np.asarray([*map(get_table_data, table_rows)], dtype="U50")
-
-    def convert_date(x):
-        """Convert date string to datetime object"""
-        if x != "":
-            return datetime.strptime(x, "%d %B").replace(year=2025)
-        else:
-            return x
-    vectorized_convert_date = np.vectorize(convert_date)
+        labels = {"table": info, "vehicle_type": self.vehicle_type, "format": "csv"}
+        with self.metrics.timer("write_seconds", **labels):
+            dataframe.set_index("park_id").to_csv(csv_name, index=True, encoding="utf-8-sig",
+                                                  date_format=CSV_DATE_FORMAT)
+        if incremental:
+            self.changes.commit(info, dataframe, target=f"csv:{destination}")
+        self.metrics.increment("rows_written_total", len(dataframe), **labels)
+
+    def save_csv_stream(self, destination: str, infos=TABLES, chunk_size: int=1000) -> None:
+        """
+        Saved the tables in csv in the destination chunk by chunk while the records are streamed from the API
+        The files are the same as those of save_csv for the same records.
+        """
 
-    mask = ph_array[:, 1] != ""
-    ph_array[:, 1][mask] = vectorized_convert_date(ph_array[:, 1][mask])
+        # Make the desired destination and continue if the desired destination already exists
+        os.makedirs(destination, exist_ok=True)
+        written = set()
+        for info, dataframe in self.iter_tables(infos=infos, chunk_size=chunk_size):
+            csv_name = os.path.join(destination, f"{info}.csv")
+            labels = {"table": info, "vehicle_type": self.vehicle_type, "format": "csv"}
+            with self.metrics.timer("write_seconds", **labels):
+                if info in written:
+                    dataframe.set_index("park_id").to_csv(csv_name, mode="a", header=False, index=True, encoding="utf-8",
+                                                          date_format=CSV_DATE_FORMAT)
+                else:
+                    # Only the first chunk starts the file with the byte order mark and the header
+                    dataframe.set_index("park_id").to_csv(csv_name, index=True, encoding="utf-8-sig",
+                                                          date_format=CSV_DATE_FORMAT)
+                    written.add(info)
+            self.metrics.increment("rows_written_total", len(dataframe), **labels)
+
+    def save_parquet(self, destination: str, info: str, table: pd.DataFrame=None) -> None:
+        """
+        Saved the dataframe in parquet with the declared datatypes in the destination
+        Tables are partitioned by vehicle type, vacancy snapshots also by the date of last_update
+        and every snapshot is appended as a new file. table takes the table already built by build_tables.
+        """
 
+        dataframe = self.get_table(info=info) if table is None else table
+        # Do not save if the vehicle type has no such information
+        if dataframe is None:
+            return
+        # Downcast datatypes depend on the values of the snapshot, the appended files must share one schema
+        dataframe = apply_schema(dataframe)
+        # Lists and dictionaries left in the table are saved as string
+        for col in dataframe.columns[dataframe.dtypes == object]:
+            dataframe[col] = dataframe[col].map(lambda value: str(value) if isinstance(value, (list, dict)) else value)
+
+        folder = os.path.join(destination, info, f"vehicle_type={self.vehicle_type}")
+        labels = {"table": info, "vehicle_type": self.vehicle_type, "format": "parquet"}
+        with self.metrics.timer("write_seconds", **labels):
+            if info == "vacancy":
+                # The vehicle type is already held by the partition
+                dataframe = dataframe.drop(columns="vehicle_type")
+                dates = pd.to_datetime(dataframe["last_update"], errors="coerce").dt.strftime("%Y-%m-%d").fillna("unknown")
+                snapshot_name = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.parquet"
+                for date, snapshot in dataframe.groupby(dates, sort=False):
+                    partition = os.path.join(folder, f"date={date}")
+                    os.makedirs(partition, exist_ok=True)
+                    snapshot.to_parquet(os.path.join(partition, snapshot_name), index=False)
+            else:
+                os.makedirs(folder, exist_ok=True)
+                dataframe.to_parquet(os.path.join(folder, f"{info}.parquet"), index=False)
+        self.metrics.increment("rows_written_total", len(dataframe), **labels)
+
+    def save_all(self, destination: str, infos=TABLES, formats=("csv",)) -> dict:
+        """Build the tables in one pass and save each of them in the formats, returns the tables keyed by info"""
+        savers = {"csv": self.save_csv, "sqlite": self.save_sqlite, "parquet": self.save_parquet}
+        for fmt in formats:
+            if not fmt in savers:
+                raise ValueError(f"Input should be one of {tuple(savers)}. Got {fmt}.")
+        tables = self.build_tables(infos=infos)
+        for info, table in tables.items():
+            # Do not save if the vehicle type has no such information
+            if table is None:
+                continue
+            for fmt in formats:
+                savers[fmt](destination=destination, info=info, table=table)
+        return tables
+
+def get_public_holiday(year: int=2025, directory: str="./holidays") -> np.ndarray:
+    """Takes in the year and returns the name, date and weekday of each public holiday, parsed once per year"""
+    calendar = HolidayCalendar(directory=directory)
+    calendar.load(year)
+    with open(calendar.path(year), "r", encoding="utf-8") as f:
+        holidays = json.load(f)["holidays"]
+    ph_array = np.asarray([(holiday["name"], f"{holiday['date']} 00:00:00", holiday["weekday"])
+                           for holiday in holidays], dtype="U50")
     return ph_array
 
 if __name__ == "__main__":
+    # Log the fetches, set the level to logging.DEBUG for the timing of every stage
+    configure_logging()
     # Initialize the vehicle type
     pc = CarparkScraper(vehicle_type="privateCar")
     # Get data before retrieving data
@@ -519,7 +702,7 @@ if __name__ == "__main__":
     
     info_list = ["address", "basic_info", "height_limits", "opening_hours", "grace_periods", "vacancy", "charges"]
     folder_path = "./data"
-    for info in info_list:
-        table = pc.save_csv(info=info, destination=folder_path)
+    # Build all the tables in one pass over the records
+    pc.save_all(destination=folder_path, infos=info_list)
     
     pass
\ No newline at end of file